@@ -1,11 +1,28 @@
-import subprocess
+import json
 
-# run generate_mapping.py
-print("Running generate_mapping.py...")
-subprocess.run(["python", "generate_mapping.py"])
+from greta.generate_mapping import iter_xapi_data, report_rejected
+from greta.ingestion import StatementValidator
+from greta.scoring_service import ScoringPipeline
 
-# run visual_chart.py
-print("Running visual_chart.py...")
-subprocess.run(["python", "visual_chart.py"])
 
-print("Both scripts have been executed.")
+def main():
+    # Score and draw in this process instead of starting greta score and
+    # greta chart as two separate interpreters
+    pipeline = ScoringPipeline()
+    validator = StatementValidator()
+
+    print("Scoring greta_xapi_example1.json...")
+    result_data = pipeline.score(iter_xapi_data('greta_xapi_example1.json', validator=validator), validator=validator)
+    report_rejected(validator)
+    with open('greta_results.json', 'w', encoding='utf-8') as f:
+        json.dump(result_data, f, ensure_ascii=False, indent=4)
+
+    print("Drawing the competency chart...")
+    with open('greta_kompetenzmodell.jpg', 'wb') as f:
+        f.write(pipeline.chart(result_data, format='jpg', dpi=300))
+
+    print("Scores and chart have been generated.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# GRETA competency scoring: xAPI statements -> facet, area and aspect scores of
+# the GRETA competency model, and the competency wheel charts drawn from them.
+#
+# Importing the package loads nothing; import the module you need, e.g.
+# greta.generate_mapping for scoring or greta.visual_chart for charts. The
+# command line is `greta <command>` (see greta.cli).
@@ -0,0 +1,330 @@
+import math
+from array import array
+
+
+def two_sum(a, b):
+    # Error-free transformation (Knuth): a + b == total + error exactly
+    total = a + b
+    b_virtual = total - a
+    return total, (a - (total - b_virtual)) + (b - b_virtual)
+
+
+class FacetAccumulator:
+    # Running statistics per facet ordinal: sum, count, min, max and sum of squares.
+    # Every statistic lives in a fixed-size array indexed by the facet ordinal, so
+    # memory is O(facets) no matter how many statements are folded in, and the
+    # averages are available without a second pass over the scores.
+    #
+    # Sums are compensated: the rounding error of every addition is carried in
+    # sums_err / sums_sq_err. That makes the result independent of how the scores
+    # were split up, so accumulators of different shards merge into exactly what
+    # a single serial pass gives.
+
+    __slots__ = ("sums", "sums_err", "counts", "mins", "maxs", "sums_sq", "sums_sq_err")
+
+    def __init__(self, size=0):
+        self.sums = array('d', [0.0]) * size
+        self.sums_err = array('d', [0.0]) * size
+        self.counts = array('q', [0]) * size
+        self.mins = array('d', [math.inf]) * size
+        self.maxs = array('d', [-math.inf]) * size
+        self.sums_sq = array('d', [0.0]) * size
+        self.sums_sq_err = array('d', [0.0]) * size
+
+    def __len__(self):
+        return len(self.counts)
+
+    def grow(self, size):
+        # Make room for facet ordinals that were assigned after this accumulator was created
+        missing = size - len(self.counts)
+        if missing > 0:
+            self.sums.extend(array('d', [0.0]) * missing)
+            self.sums_err.extend(array('d', [0.0]) * missing)
+            self.counts.extend(array('q', [0]) * missing)
+            self.mins.extend(array('d', [math.inf]) * missing)
+            self.maxs.extend(array('d', [-math.inf]) * missing)
+            self.sums_sq.extend(array('d', [0.0]) * missing)
+            self.sums_sq_err.extend(array('d', [0.0]) * missing)
+
+    def add(self, ordinal, score):
+        if ordinal >= len(self.counts):
+            self.grow(ordinal + 1)
+        self.sums[ordinal], error = two_sum(self.sums[ordinal], score)
+        self.sums_err[ordinal] += error
+        self.sums_sq[ordinal], error = two_sum(self.sums_sq[ordinal], score * score)
+        self.sums_sq_err[ordinal] += error
+        self.counts[ordinal] += 1
+        if score < self.mins[ordinal]:
+            self.mins[ordinal] = score
+        if score > self.maxs[ordinal]:
+            self.maxs[ordinal] = score
+
+    def merge(self, other, ordinal_map=None):
+        # Fold another accumulator (e.g. from a different shard) into this one.
+        # ordinal_map translates the ordinals of other into ours when the two
+        # were numbered independently.
+        for ordinal in range(len(other)):
+            if not other.counts[ordinal]:
+                continue
+            target = ordinal_map[ordinal] if ordinal_map is not None else ordinal
+            if target >= len(self.counts):
+                self.grow(target + 1)
+            self.sums[target], error = two_sum(self.sums[target], other.sums[ordinal])
+            self.sums_err[target] += other.sums_err[ordinal] + error
+            self.sums_sq[target], error = two_sum(self.sums_sq[target], other.sums_sq[ordinal])
+            self.sums_sq_err[target] += other.sums_sq_err[ordinal] + error
+            self.counts[target] += other.counts[ordinal]
+            self.mins[target] = min(self.mins[target], other.mins[ordinal])
+            self.maxs[target] = max(self.maxs[target], other.maxs[ordinal])
+        return self
+
+    def count(self, ordinal):
+        return self.counts[ordinal] if ordinal < len(self.counts) else 0
+
+    def weight(self, ordinal):
+        # Every statement weighs 1 here; see WeightedFacetAccumulator
+        return float(self.count(ordinal))
+
+    def total(self, ordinal):
+        return self.sums[ordinal] + self.sums_err[ordinal]
+
+    def mean(self, ordinal):
+        # Facets without any statement score 0, like the hierarchy defaults
+        count = self.count(ordinal)
+        return self.total(ordinal) / count if count else 0.0
+
+    def variance(self, ordinal):
+        # Population variance; clamped because E[x^2] - E[x]^2 can dip below 0 by rounding
+        count = self.count(ordinal)
+        if not count:
+            return 0.0
+        mean = self.total(ordinal) / count
+        return max((self.sums_sq[ordinal] + self.sums_sq_err[ordinal]) / count - mean * mean, 0.0)
+
+    def stddev(self, ordinal):
+        return math.sqrt(self.variance(ordinal))
+
+
+class WeightedFacetAccumulator(FacetAccumulator):
+    # FacetAccumulator of weighted scores: sums and sums_sq hold weight * score and
+    # weight * score^2, weights the (compensated) sum of the statement weights.
+    # Means and variances are weighted; counts, mins and maxs stay per statement.
+
+    __slots__ = ("weights", "weights_err")
+
+    def __init__(self, size=0):
+        super().__init__(size)
+        self.weights = array('d', [0.0]) * size
+        self.weights_err = array('d', [0.0]) * size
+
+    def grow(self, size):
+        missing = size - len(self.counts)
+        super().grow(size)
+        if missing > 0:
+            self.weights.extend(array('d', [0.0]) * missing)
+            self.weights_err.extend(array('d', [0.0]) * missing)
+
+    def add(self, ordinal, score, weight=1.0):
+        if ordinal >= len(self.counts):
+            self.grow(ordinal + 1)
+        # two_sum inlined three times: this is the per-statement path of weighted runs
+        value = weight * score
+        previous = self.sums[ordinal]
+        total = previous + value
+        virtual = total - previous
+        self.sums[ordinal] = total
+        self.sums_err[ordinal] += (previous - (total - virtual)) + (value - virtual)
+        value *= score
+        previous = self.sums_sq[ordinal]
+        total = previous + value
+        virtual = total - previous
+        self.sums_sq[ordinal] = total
+        self.sums_sq_err[ordinal] += (previous - (total - virtual)) + (value - virtual)
+        previous = self.weights[ordinal]
+        total = previous + weight
+        virtual = total - previous
+        self.weights[ordinal] = total
+        self.weights_err[ordinal] += (previous - (total - virtual)) + (weight - virtual)
+        self.counts[ordinal] += 1
+        if score < self.mins[ordinal]:
+            self.mins[ordinal] = score
+        if score > self.maxs[ordinal]:
+            self.maxs[ordinal] = score
+
+    def merge(self, other, ordinal_map=None):
+        super().merge(other, ordinal_map)
+        for ordinal in range(len(other)):
+            if not other.counts[ordinal]:
+                continue
+            target = ordinal_map[ordinal] if ordinal_map is not None else ordinal
+            self.weights[target], error = two_sum(self.weights[target], other.weights[ordinal])
+            self.weights_err[target] += other.weights_err[ordinal] + error
+        return self
+
+    def weight(self, ordinal):
+        if not self.count(ordinal):
+            return 0.0
+        return self.weights[ordinal] + self.weights_err[ordinal]
+
+    def mean(self, ordinal):
+        weight = self.weight(ordinal)
+        return self.total(ordinal) / weight if weight else 0.0
+
+    def variance(self, ordinal):
+        weight = self.weight(ordinal)
+        if not weight:
+            return 0.0
+        mean = self.total(ordinal) / weight
+        return max((self.sums_sq[ordinal] + self.sums_sq_err[ordinal]) / weight - mean * mean, 0.0)
+
+
+class DecayAccumulator:
+    # Exponentially decayed statistics per facet ordinal: a score that is one
+    # half-life older than the newest score of its facet counts half as much.
+    # Every facet keeps its sums relative to the time of its newest score, so a
+    # statement costs O(1) and statements may arrive out of order. The decayed
+    # mean does not depend on when it is read, since the decay of sums and weight
+    # cancels; weight() gives the remaining evidence at a point in time.
+    # Timestamps and the half-life are in seconds.
+
+    __slots__ = ("half_life", "sums", "sums_sq", "weights", "counts", "references")
+
+    def __init__(self, half_life, size=0):
+        self.half_life = half_life
+        self.sums = array('d', [0.0]) * size
+        self.sums_sq = array('d', [0.0]) * size
+        self.weights = array('d', [0.0]) * size
+        self.counts = array('q', [0]) * size
+        self.references = array('d', [-math.inf]) * size
+
+    def __len__(self):
+        return len(self.counts)
+
+    def grow(self, size):
+        missing = size - len(self.counts)
+        if missing > 0:
+            self.sums.extend(array('d', [0.0]) * missing)
+            self.sums_sq.extend(array('d', [0.0]) * missing)
+            self.weights.extend(array('d', [0.0]) * missing)
+            self.counts.extend(array('q', [0]) * missing)
+            self.references.extend(array('d', [-math.inf]) * missing)
+
+    def add(self, ordinal, score, time):
+        if ordinal >= len(self.counts):
+            self.grow(ordinal + 1)
+        reference = self.references[ordinal]
+        if time >= reference:
+            # Age the sums to the new reference time, then add at full weight
+            factor = 0.5 ** ((time - reference) / self.half_life)
+            self.sums[ordinal] = self.sums[ordinal] * factor + score
+            self.sums_sq[ordinal] = self.sums_sq[ordinal] * factor + score * score
+            self.weights[ordinal] = self.weights[ordinal] * factor + 1.0
+            self.references[ordinal] = time
+        else:
+            weight = 0.5 ** ((reference - time) / self.half_life)
+            self.sums[ordinal] += weight * score
+            self.sums_sq[ordinal] += weight * score * score
+            self.weights[ordinal] += weight
+        self.counts[ordinal] += 1
+
+    def merge(self, other, ordinal_map=None):
+        for ordinal in range(len(other)):
+            if not other.counts[ordinal]:
+                continue
+            target = ordinal_map[ordinal] if ordinal_map is not None else ordinal
+            if target >= len(self.counts):
+                self.grow(target + 1)
+            reference = max(self.references[target], other.references[ordinal])
+            own = 0.5 ** ((reference - self.references[target]) / self.half_life) if self.counts[target] else 0.0
+            theirs = 0.5 ** ((reference - other.references[ordinal]) / self.half_life)
+            self.sums[target] = self.sums[target] * own + other.sums[ordinal] * theirs
+            self.sums_sq[target] = self.sums_sq[target] * own + other.sums_sq[ordinal] * theirs
+            self.weights[target] = self.weights[target] * own + other.weights[ordinal] * theirs
+            self.references[target] = reference
+            self.counts[target] += other.counts[ordinal]
+        return self
+
+    def count(self, ordinal):
+        return self.counts[ordinal] if ordinal < len(self.counts) else 0
+
+    def weight(self, ordinal, time):
+        # Decayed number of statements behind the facet score as of time
+        if not self.count(ordinal):
+            return 0.0
+        return self.weights[ordinal] * 0.5 ** (max(time - self.references[ordinal], 0.0) / self.half_life)
+
+    def mean(self, ordinal):
+        return self.sums[ordinal] / self.weights[ordinal] if self.count(ordinal) else 0.0
+
+    def variance(self, ordinal):
+        # Weighted population variance, clamped like FacetAccumulator.variance
+        if not self.count(ordinal):
+            return 0.0
+        mean = self.sums[ordinal] / self.weights[ordinal]
+        return max(self.sums_sq[ordinal] / self.weights[ordinal] - mean * mean, 0.0)
+
+    def stddev(self, ordinal):
+        return math.sqrt(self.variance(ordinal))
+
+
+class TimeBucketAccumulator:
+    # FacetAccumulators per fixed-width time bucket (bucket index = time // width,
+    # counted from the Unix epoch, so day buckets start at midnight UTC). A
+    # statement only touches its own bucket; tumbling windows are the buckets
+    # themselves, sliding windows merge the buckets they cover, and trends fit a
+    # line through the bucket means. None of these go back to the statements.
+
+    __slots__ = ("width", "size", "buckets")
+
+    def __init__(self, width, size=0):
+        self.width = width
+        self.size = size
+        self.buckets = {}
+
+    def add(self, ordinal, score, time):
+        index = math.floor(time / self.width)
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = FacetAccumulator(self.size)
+        bucket.add(ordinal, score)
+
+    def merge(self, other):
+        for index, bucket in other.buckets.items():
+            if index not in self.buckets:
+                self.buckets[index] = FacetAccumulator(self.size)
+            self.buckets[index].merge(bucket)
+        return self
+
+    def tumbling(self):
+        # (window start, accumulator) in time order
+        for index in sorted(self.buckets):
+            yield index * self.width, self.buckets[index]
+
+    def window(self, end, length):
+        # Everything in the buckets that overlap (end - length, end]; the window
+        # edges are rounded out to whole buckets. Without buckets there is no
+        # newest statement to end at, and the window is empty.
+        merged = FacetAccumulator(self.size)
+        if not self.buckets:
+            return merged
+        first = math.floor((end - length) / self.width)
+        last = math.floor(end / self.width)
+        for index in sorted(self.buckets):
+            if first <= index <= last:
+                merged.merge(self.buckets[index])
+        return merged
+
+    def trend(self, ordinal):
+        # Bucket means of one facet as (bucket start, mean, count), and the slope
+        # of the count-weighted least squares line through them per second
+        # (None with fewer than two buckets)
+        points = [(start, bucket.mean(ordinal), bucket.count(ordinal))
+                  for start, bucket in self.tumbling() if bucket.count(ordinal)]
+        total = sum(count for _, _, count in points)
+        if len(points) < 2:
+            return points, None
+        mean_time = sum(start * count for start, _, count in points) / total
+        mean_score = sum(score * count for _, score, count in points) / total
+        covariance = sum(count * (start - mean_time) * (score - mean_score) for start, score, count in points)
+        spread = sum(count * (start - mean_time) ** 2 for start, _, count in points)
+        return points, covariance / spread
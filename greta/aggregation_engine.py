@@ -0,0 +1,177 @@
+from collections import Counter
+
+import numpy as np
+
+from .generate_mapping import ALL_LEARNERS, FacetResolver, learner_id, normalize_score
+from .recommendations import resource_catalog
+
+
+class ScoreMatrix:
+    # Per learner and facet ordinal sums, squared sums and counts of normalized
+    # scores, one row per learner (learners x facets). Sums are compensated like
+    # those of FacetAccumulator, i.e. sums already include their error terms.
+    # skipped counts the statements of facets the model does not know by their
+    # FacetResolver ordinal; they have no column.
+
+    def __init__(self, learners, sums, sums_sq, counts, skipped=None):
+        self.learners = learners
+        self.sums = sums
+        self.sums_sq = sums_sq
+        self.counts = counts
+        self.skipped = skipped if skipped is not None else Counter()
+
+    def count(self, ordinal):
+        # Statements of a facet over all learners, like FacetAccumulator.count,
+        # so Metrics.record_facet_misses reads the skipped ones off the matrix
+        if ordinal < self.counts.shape[1]:
+            return int(self.counts[:, ordinal].sum())
+        return self.skipped[ordinal]
+
+    def statements(self):
+        return int(self.counts.sum()) + sum(self.skipped.values())
+
+    def means(self):
+        # Facets without statements score 0, like the hierarchy defaults
+        means = np.zeros_like(self.sums)
+        np.divide(self.sums, self.counts, out=means, where=self.counts > 0)
+        return means
+
+    def variances(self):
+        means = self.means()
+        mean_squares = np.zeros_like(self.sums_sq)
+        np.divide(self.sums_sq, self.counts, out=mean_squares, where=self.counts > 0)
+        return np.maximum(mean_squares - means * means, 0.0)
+
+
+def compensated_cell_sums(cells, value_columns, n_cells):
+    # The two_sum steps of FacetAccumulator.add for every cell at once, bit for
+    # bit. The scores are sorted by cell (stably, so each cell keeps statement
+    # order) and laid out one row per cell, padded with zeros; cumsum along the
+    # rows adds left to right like the running sums, and the errors of those
+    # additions are summed the same way. Cells are grouped into power-of-two
+    # count classes, so the padding stays below the number of scores and there
+    # are at most log2(statements) whole-array passes. Returns the sums of every
+    # column of value_columns (all of the same length as cells) and the counts.
+    order = np.argsort(cells, kind='stable')
+    counts = np.bincount(cells, minlength=n_cells)
+    starts = np.cumsum(counts) - counts
+    sums = [np.zeros(n_cells) for _ in value_columns]
+    filled = np.flatnonzero(counts)
+    classes = np.frexp(counts[filled])[1]
+    for count_class in np.unique(classes):
+        members = filled[classes == count_class]
+        member_counts = counts[members]
+        columns = np.arange(member_counts.max())
+        padding = columns >= member_counts[:, None]
+        index = order[np.minimum(starts[members][:, None] + columns, len(order) - 1)]
+        for values, column_sums in zip(value_columns, sums):
+            block = values[index]
+            block[padding] = 0.0
+            running = np.cumsum(block, axis=1)
+            previous = np.zeros_like(running)
+            previous[:, 1:] = running[:, :-1]
+            value_virtual = running - previous
+            errors = (previous - (running - value_virtual)) + (block - value_virtual)
+            column_sums[members] = running[:, -1] + np.cumsum(errors, axis=1)[:, -1]
+    return sums, counts
+
+
+def score_matrix(xapi_activities, model, by_learner=True, resolver=None):
+    # Single scan that only gathers (learner, facet, score) triples; the sums are
+    # then built per cell in statement order, like the Python path.
+    # Facets the model does not know are left out (and counted in resolver.unresolved
+    # and ScoreMatrix.skipped).
+    resolver = resolver or FacetResolver(model.hierarchy())
+    skipped = Counter()
+    learner_ordinals = {}
+    learner_column = []
+    facet_column = []
+    score_column = []
+    for activity in xapi_activities:
+        statement = activity["statement"]
+        facet_ordinal = resolver.ordinal(statement["context"]["extensions"]["learningObjectMetadata"])
+        if facet_ordinal >= resolver.known:
+            skipped[facet_ordinal] += 1
+            continue
+        learner = learner_id(statement["actor"]) if by_learner else ALL_LEARNERS
+        if learner not in learner_ordinals:
+            learner_ordinals[learner] = len(learner_ordinals)
+        learner_column.append(learner_ordinals[learner])
+        facet_column.append(facet_ordinal)
+        score_column.append(normalize_score(statement["result"]["score"]))
+
+    if not by_learner and not learner_ordinals:
+        learner_ordinals[ALL_LEARNERS] = 0
+
+    n_learners = len(learner_ordinals)
+    n_facets = len(model.facet_ids)
+    cells = np.asarray(learner_column, dtype=np.int64) * n_facets + np.asarray(facet_column, dtype=np.int64)
+    scores = np.asarray(score_column, dtype=np.float64)
+    shape = (n_learners, n_facets)
+    (sums, sums_sq), counts = compensated_cell_sums(cells, (scores, scores * scores), n_learners * n_facets)
+    return ScoreMatrix(list(learner_ordinals), sums.reshape(shape), sums_sq.reshape(shape), counts.reshape(shape), skipped)
+
+
+def _segment_means(values, offsets):
+    # Mean over the column segments [offsets[i], offsets[i + 1]) of every row.
+    # The segment sums are built column by column (t-th member of every segment
+    # at once), which keeps the left-to-right order of sum() over a list and so
+    # gives bit-identical results to map_activities_to_competencies; np.add.reduceat
+    # is free to reassociate and drifts by an ulp. Segments are a handful of
+    # columns wide, so this is still a few whole-matrix operations.
+    # Empty segments score 0 like empty areas do.
+    offsets = np.asarray(offsets)
+    starts = offsets[:-1]
+    sizes = np.diff(offsets)
+    sums = np.zeros((values.shape[0], len(sizes)))
+    for t in range(int(sizes.max(initial=0))):
+        members = t < sizes
+        sums[:, members] += values[:, starts[members] + t]
+    filled = sizes > 0
+    means = np.zeros_like(sums)
+    means[:, filled] = sums[:, filled] / sizes[filled]
+    return means, filled
+
+
+def roll_up(facet_means, model):
+    # facet -> area -> aspect means for all learners at once
+    area_means, filled_areas = _segment_means(facet_means, model.facet_offsets)
+    aspect_means, _ = _segment_means(area_means, model.area_offsets)
+    return area_means, aspect_means, filled_areas
+
+
+def engine_results(matrix, model, mapping_table_resource):
+    # The records of map_activities_to_competencies for every row of the matrix
+    facet_means = matrix.means()
+    variances = matrix.variances()
+    stddevs = np.sqrt(variances)
+    area_means, aspect_means, filled_areas = roll_up(facet_means, model)
+
+    facet_paths = [model.facet_path(k) for k in range(len(model.facet_ids))]
+    area_paths = [model.area_path(j) for j in range(len(model.area_ids))]
+    catalog = resource_catalog(mapping_table_resource)
+
+    results = {}
+    for row, learner in enumerate(matrix.learners):
+        facet_scores = [
+            {
+                "id": facet_paths[k],
+                "achievement": float(facet_means[row, k]),
+                "count": int(matrix.counts[row, k]),
+                "variance": float(variances[row, k]),
+                "stddev": float(stddevs[row, k]),
+            }
+            for k in range(len(facet_paths))
+        ]
+        area_scores = [
+            {"id": area_paths[j], "achievement": float(area_means[row, j]) if filled_areas[j] else 0}
+            for j in range(len(area_paths))
+        ]
+        aspect_scores = [
+            {"id": model.aspect_names[i], "achievement": float(aspect_means[row, i])}
+            for i in range(len(model.aspect_names))
+        ]
+        low_score_links = catalog.low_score_links(
+            {model.facet_names[k]: float(facet_means[row, k]) for k in np.flatnonzero(facet_means[row] < 0.5)})
+        results[learner] = (facet_scores, area_scores, aspect_scores, low_score_links)
+    return results
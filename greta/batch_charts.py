@@ -0,0 +1,122 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import matplotlib
+matplotlib.use('Agg')  # batch nodes are headless; must happen before pyplot is imported
+
+from .competency_model import MODEL_FILE, load_competency_model
+from .generate_mapping import open_xapi_file, iter_json_values
+from .results_file import ResultsFile, is_results_file
+from .visual_chart import ChartRenderer, cohort_medians
+
+CHUNK_SIZE = 32
+
+# Renderer of the current worker process, built once by init_worker
+_renderer = None
+
+
+def iter_learner_results(file_path, model_file=MODEL_FILE):
+    # Per-learner results: either the document of greta score --by-learner
+    # ({learner: results}), a stream (JSON array / NDJSON, optionally gzipped) of
+    # results documents that carry their learner under "learner", or a binary
+    # results file, whose rows are passed on as achievements by ordinal
+    if is_results_file(file_path):
+        with ResultsFile(file_path) as results:
+            results.check_model(load_competency_model(model_file))
+            for learner in results.learners:
+                # Views into the memory map; they stay valid after the file is closed
+                yield learner, results.scores(learner)
+        return
+    with open_xapi_file(file_path) as f:
+        for document in iter_json_values(f):
+            if "learner" in document:
+                yield document["learner"], document
+            else:
+                yield from document.items()
+
+
+def chart_file_name(learner, format):
+    # Learner IDs are URLs or mailto: addresses; keep a readable part and add a
+    # hash so that IDs differing only in punctuation do not collide
+    readable = re.sub(r'[^\w.-]+', '_', learner).strip('_')[-60:]
+    digest = hashlib.sha1(learner.encode('utf-8')).hexdigest()[:10]
+    return f"{readable}-{digest}.{format}"
+
+
+def init_worker(model_file, cohort_file=None):
+    global _renderer
+    model = load_competency_model(model_file)
+    medians = None
+    if cohort_file:
+        with open(cohort_file, 'r', encoding='utf-8') as f:
+            medians = cohort_medians(model, json.load(f))
+    _renderer = ChartRenderer(model, medians)
+
+
+def render_chunk(chunk, output_dir, format, dpi):
+    for learner, result_data in chunk:
+        _renderer.render(result_data, os.path.join(output_dir, chart_file_name(learner, format)), format=format, dpi=dpi)
+    return len(chunk)
+
+
+def iter_chunks(items, size=CHUNK_SIZE):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_charts(results_file, output_dir, workers=None, format='png', dpi=100, model_file=MODEL_FILE, cohort_file=None):
+    # Render one chart per learner across a process pool; every worker builds the
+    # wheel once and then only recolors it. cohort_file (output of
+    # cohort_analytics.py) adds the cohort median ring. Returns (charts, seconds).
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    count = 0
+    if workers == 1:
+        init_worker(model_file, cohort_file)
+        for chunk in iter_chunks(iter_learner_results(results_file, model_file)):
+            count += render_chunk(chunk, output_dir, format, dpi)
+        return count, time.perf_counter() - started
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(model_file, cohort_file)) as pool:
+        # Keep a bounded number of chunks in flight so a large results stream is
+        # not read into memory ahead of the workers
+        pending = set()
+        for chunk in iter_chunks(iter_learner_results(results_file, model_file)):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                count += sum(future.result() for future in done)
+            pending.add(pool.submit(render_chunk, chunk, output_dir, format, dpi))
+        count += sum(future.result() for future in wait(pending).done)
+    return count, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render one competency chart per learner.")
+    parser.add_argument("results_file", help="output of greta score --by-learner (JSON or binary), or a "
+                                             "JSON/NDJSON stream of results documents with a \"learner\" field")
+    parser.add_argument("-o", "--output-dir", default="charts")
+    parser.add_argument("-j", "--workers", type=int, help="render processes (default: all cores)")
+    parser.add_argument("--format", choices=("png", "jpg", "svg"), default="png")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    parser.add_argument("--cohort", metavar="FILE", help="overlay the facet medians of greta cohort output as an outer ring")
+    args = parser.parse_args()
+
+    count, seconds = render_charts(args.results_file, args.output_dir, args.workers, args.format, args.dpi, args.model,
+                                   args.cohort)
+    rate = count / seconds if seconds else 0.0
+    print(f"Rendered {count} charts in {seconds:.1f}s ({rate:.1f} charts/sec) to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
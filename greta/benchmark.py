@@ -0,0 +1,300 @@
+import argparse
+import bisect
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from .competency_model import MODEL_FILE, TRANSLITERATION, load_competency_model
+from .aggregation_engine import score_matrix
+from .generate_mapping import (FacetResolver, iter_xapi_data, map_activities_by_learner, map_activities_to_competencies,
+                               mapping_table_resource, parse_arguments, score_files, statement_validator)
+from .results_file import write_arrays
+from .visual_chart import ChartRenderer, draw_chart
+
+RESULTS_FILE = 'benchmark_results.jsonl'
+
+VERB_COMPLETED = {"id": "http://adlnet.gov/expapi/verbs/completed", "display": {"en-US": "completed"}}
+HOME_PAGE = "https://eulelernbereich.h5p.com"
+
+
+def path_segment(name):
+    # "Berufspraktisches Wissen und Können" -> "BerufspraktischesWissenUndKoennen",
+    # the way the H5P metadata spells the competencePath
+    words = re.split(r'[\s/-]+', name.translate(TRANSLITERATION))
+    return ''.join(re.sub(r'\W', '', word[:1].upper() + word[1:]) for word in words)
+
+
+def zipf_weights(count, skew):
+    # Cumulative weights of a Zipf distribution; skew 0 is uniform
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** skew
+        cum_weights.append(total)
+    return cum_weights
+
+
+def pick(rnd, cum_weights):
+    return bisect.bisect(cum_weights, rnd.random() * cum_weights[-1])
+
+
+def synthetic_statements(statement_count, learner_count, skew=1.0, seed=1, model=None):
+    # Learning Locker export records (envelope with the xAPI statement inside)
+    # spread over the facets of the model. Skew shapes how activity concentrates
+    # on a few learners and a few facets, as in real course data.
+    model = model or load_competency_model()
+    rnd = random.Random(seed)
+    learners = [f"{rnd.getrandbits(128):032x}" for _ in range(learner_count)]
+    facets = list(range(len(model.facet_ids)))
+    rnd.shuffle(facets)
+    learner_weights = zipf_weights(learner_count, skew)
+    facet_weights = zipf_weights(len(facets), skew)
+    paths = [
+        '/'.join([model.id, path_segment(model.aspect_names[model.area_aspect[model.facet_area[k]]]),
+                  path_segment(model.area_names[model.facet_area[k]]), path_segment(model.facet_names[k])])
+        for k in range(len(model.facet_ids))
+    ]
+    stored = datetime(2023, 9, 1, tzinfo=timezone.utc)
+
+    for index in range(statement_count):
+        learner = learners[pick(rnd, learner_weights)]
+        k = facets[pick(rnd, facet_weights)]
+        j = model.facet_area[k]
+        score_max = rnd.choice((3, 5, 7, 10))
+        raw = rnd.randint(0, score_max)
+        stored += timedelta(seconds=rnd.expovariate(1 / 30))
+        timestamp = stored.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        content_id = str(10 ** 18 + k * 1000 + rnd.randrange(1000))
+        yield {
+            "stored": timestamp,
+            "active": True,
+            "voided": False,
+            "agents": [f"{HOME_PAGE}|{learner}"],
+            "statement": {
+                "id": f"{rnd.getrandbits(128):032x}",
+                "stored": timestamp,
+                "timestamp": timestamp,
+                "version": "1.0.0",
+                "actor": {"account": {"name": learner, "homePage": HOME_PAGE}, "objectType": "Agent"},
+                "verb": VERB_COMPLETED,
+                "object": {"id": f"{HOME_PAGE}/lti/content/{content_id}", "objectType": "Activity"},
+                "context": {
+                    "extensions": {
+                        "learningObjectMetadata": {
+                            "general_title_string": f"Lernbaustein {content_id[-6:]}",
+                            "competencePath": paths[k],
+                            "tree": "GRETA Kompetenzmodell 2.0",
+                            "aspect": model.aspect_names[model.area_aspect[j]],
+                            "area": model.area_names[j],
+                            "facet": model.facet_names[k],
+                            "level": rnd.randint(1, 3),
+                            "educational_typicalLearningTime_duration": rnd.choice(("45m", "1h30m", "3h45m")),
+                            "credits": rnd.randint(1, 3),
+                        }
+                    }
+                },
+                "result": {
+                    "score": {"min": 0, "max": score_max, "raw": raw, "scaled": raw / score_max},
+                    "completion": True,
+                    "success": raw * 2 >= score_max,
+                    "duration": f"PT{rnd.uniform(10, 600):.2f}S",
+                },
+            },
+        }
+
+
+def write_export(file_path, statements, ndjson=False):
+    # One JSON array, written record by record like a Learning Locker export, or
+    # one record per line (NDJSON), which greta score --workers splits into byte ranges
+    with open(file_path, 'w', encoding='utf-8') as f:
+        if ndjson:
+            for statement in statements:
+                f.write(json.dumps(statement, ensure_ascii=False) + '\n')
+            return
+        f.write('[')
+        for index, statement in enumerate(statements):
+            if index:
+                f.write(',\n')
+            json.dump(statement, f, ensure_ascii=False)
+        f.write(']\n')
+
+
+def score_export(argv, model):
+    # What greta score runs for these options, from streaming the files to the
+    # results, without writing them: parse, validate, resolve and aggregate
+    args = parse_arguments(argv)
+    validator = statement_validator(args)
+    xapi_activities = (activity for xapi_file in args.xapi_files for activity in iter_xapi_data(xapi_file, None, validator))
+    output_data = score_files(args, model, xapi_activities, FacetResolver(model.hierarchy()), None, validator)
+    validator.close()
+    return output_data
+
+
+def measure(stage, items, function, repeat, trace_memory):
+    # Best of `repeat` untraced runs for the time; one extra run under
+    # tracemalloc for the peak of Python allocations
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - started)
+    record = {"stage": stage, "items": items, "seconds": min(seconds),
+              "per_second": items / min(seconds) if min(seconds) else None}
+    if trace_memory:
+        del result
+        tracemalloc.start()
+        try:
+            result = function()
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return record, result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(statement_count, learner_count, skew=1.0, seed=1, repeat=3, charts=20, trace_memory=True,
+                   model_file=MODEL_FILE, workers=None):
+    # The scoring stages run the code paths of greta score end to end (streaming
+    # parse, validation, aggregation and roll-up) on a JSON array export, and
+    # --workers on the same statements as NDJSON. tracemalloc only sees the
+    # parent process of the worker pool.
+    model = load_competency_model(model_file)
+    workers = workers or os.cpu_count() or 1
+    stages = []
+    with tempfile.TemporaryDirectory() as scratch:
+        export_file = os.path.join(scratch, 'xapi_export.json')
+        ndjson_file = os.path.join(scratch, 'xapi_export.ndjson')
+        write_export(export_file, synthetic_statements(statement_count, learner_count, skew, seed, model))
+        write_export(ndjson_file, synthetic_statements(statement_count, learner_count, skew, seed, model), ndjson=True)
+
+        def ingest():
+            validator = statement_validator(parse_arguments([export_file]))
+            return sum(1 for _ in iter_xapi_data(export_file, None, validator))
+
+        record, _ = measure("ingest", statement_count, ingest, repeat, trace_memory)
+        stages.append(record)
+
+        # Aggregation alone, over activities parsed and slimmed beforehand, so its
+        # throughput is tracked apart from parsing (which the score_* stages include)
+        activities = list(iter_xapi_data(export_file, None, statement_validator(parse_arguments([export_file]))))
+        hierarchy = model.hierarchy()
+        aggregation_stages = [
+            ("aggregate_python", lambda: map_activities_to_competencies(iter(activities), hierarchy, mapping_table_resource)),
+            ("aggregate_python_by_learner", lambda: map_activities_by_learner(iter(activities), hierarchy, mapping_table_resource)),
+            ("aggregate_numpy_by_learner", lambda: score_matrix(iter(activities), model)),
+        ]
+        for stage, aggregate in aggregation_stages:
+            record, _ = measure(stage, statement_count, aggregate, repeat, trace_memory)
+            stages.append(record)
+        del activities
+
+        scoring_stages = [
+            ("score_python", [export_file]),
+            ("score_python_by_learner", [export_file, "--by-learner"]),
+            ("score_numpy", [export_file, "--engine", "numpy"]),
+            ("score_numpy_by_learner", [export_file, "--engine", "numpy", "--by-learner"]),
+            (f"score_workers_{workers}_by_learner", [ndjson_file, "--by-learner", "--workers", str(workers)]),
+        ]
+        for stage, argv in scoring_stages:
+            record, output_data = measure(stage, statement_count, lambda: score_export(argv, model), repeat, trace_memory)
+            stages.append(record)
+            if stage == "score_python":
+                result_data = output_data
+
+        learners, arrays = score_export([export_file, "--by-learner", "--format", "binary"], model)
+        record, _ = measure("serialize_binary_by_learner", len(learners),
+                            lambda: write_arrays(os.path.join(scratch, 'greta_results.grr'), model, learners, arrays, True),
+                            repeat, trace_memory)
+        stages.append(record)
+
+        def serialize():
+            with open(os.path.join(scratch, 'greta_results.json'), 'w', encoding='utf-8') as f:
+                json.dump(result_data, f, ensure_ascii=False, indent=4)
+
+        record, _ = measure("serialize_results", 1, serialize, repeat, trace_memory)
+        stages.append(record)
+
+        def render_figure():
+            # The original path: a new figure per chart, saved with bbox_inches='tight'
+            for _ in range(charts):
+                fig = draw_chart(result_data, model)
+                fig.savefig(os.path.join(scratch, 'chart.png'), format='png', bbox_inches='tight', dpi=100)
+                plt.close(fig)
+
+        record, _ = measure("render_chart", charts, render_figure, 1, trace_memory)
+        stages.append(record)
+
+        renderer = ChartRenderer(model)
+
+        def render_reused():
+            for _ in range(charts):
+                renderer.render(result_data, os.path.join(scratch, 'chart.png'), format='png', dpi=100)
+
+        record, _ = measure("render_chart_reused", charts, render_reused, 1, trace_memory)
+        renderer.close()
+        stages.append(record)
+        export_bytes = os.path.getsize(export_file)
+
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": {"statements": statement_count, "learners": learner_count, "skew": skew, "seed": seed,
+                       "repeat": repeat, "charts": charts, "workers": workers, "export_bytes": export_bytes},
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mapping and rendering paths on synthetic xAPI data.")
+    parser.add_argument("-n", "--statements", type=int, default=100000)
+    parser.add_argument("-l", "--learners", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of learner and facet activity (0: uniform)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per stage (best is kept)")
+    parser.add_argument("--charts", type=int, default=20, help="charts rendered per rendering stage")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON lines file the run is appended to")
+    parser.add_argument("-j", "--workers", type=int, help="processes of the --workers stage (default: all CPUs)")
+    parser.add_argument("--generate", metavar="FILE", help="only write a synthetic export to FILE")
+    parser.add_argument("--ndjson", action="store_true", help="with --generate, write one statement per line")
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    args = parser.parse_args()
+
+    if args.generate:
+        write_export(args.generate, synthetic_statements(args.statements, args.learners, args.skew, args.seed,
+                                                         load_competency_model(args.model)), args.ndjson)
+        print(f"Wrote {args.statements} statements to {args.generate}")
+        return
+
+    run = run_benchmarks(args.statements, args.learners, args.skew, args.seed, args.repeat, args.charts,
+                         not args.no_memory, args.model, args.workers)
+    for stage in run["stages"]:
+        peak = f"{stage['peak_bytes'] / 2**20:9.1f} MiB" if "peak_bytes" in stage else ""
+        print(f"{stage['stage']:32} {stage['seconds']:9.3f}s {stage['per_second'] or 0:12.1f}/s {peak}")
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, ensure_ascii=False) + '\n')
+    print(f"Appended to {args.results}")
+
+
+if __name__ == '__main__':
+    main()
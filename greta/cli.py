@@ -0,0 +1,42 @@
+import importlib
+import sys
+
+# command -> (module, summary). Modules are imported only for the command that
+# runs, so scoring never loads matplotlib and --help loads nothing at all.
+COMMANDS = {
+    "score": ("generate_mapping", "map xAPI statements onto competency scores"),
+    "chart": ("visual_chart", "draw the competency wheel of a results document"),
+    "charts": ("batch_charts", "render one competency chart per learner"),
+    "export": ("results_file", "export a binary results file as JSON"),
+    "recommend": ("recommendations", "recommend learning resources for weak facets"),
+    "cohort": ("cohort_analytics", "cohort percentiles and histograms of per-learner results"),
+    "serve": ("scoring_service", "serve scores and charts over HTTP"),
+    "benchmark": ("benchmark", "benchmark mapping and rendering on synthetic data"),
+}
+
+
+def usage():
+    lines = ["usage: greta <command> [options]", "", "commands:"]
+    lines += [f"  {command:<11}{summary}" for command, (_, summary) in COMMANDS.items()]
+    lines += ["", "greta <command> --help shows the options of a command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    command, *arguments = argv
+    if command not in COMMANDS:
+        print(f"greta: unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(f".{COMMANDS[command][0]}", __package__)
+    # The commands parse sys.argv themselves; name them after the subcommand in usage and errors
+    sys.argv = [f"greta {command}", *arguments]
+    module.main()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import json
+
+import numpy as np
+
+from .competency_model import MODEL_FILE, load_competency_model
+from .results_file import ResultsFile, is_results_file, level_sizes, results_arrays
+
+DEFAULT_BINS = 100
+
+# Percentiles written per facet, area and aspect besides the histogram
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Column of a results file -> level of the competency model
+LEVEL_COLUMNS = {"facet": "facet_achievement", "area": "area_achievement", "aspect": "aspect_achievement"}
+
+
+class ScoreHistogram:
+    # Fixed-bin histograms over the achievement range 0..1, one row per ordinal.
+    # Memory is ordinals x bins counters however many learners are added, and two
+    # histograms with the same bins merge by adding their counters, so shards,
+    # time windows or earlier runs combine into exactly the histogram of all their
+    # learners. Percentiles interpolate linearly inside a bin and are accurate to
+    # 1 / bins. Each ordinal counts only the learners it was added for (see add),
+    # so its total is the number of learners covered.
+
+    def __init__(self, size, bins=DEFAULT_BINS):
+        self.bins = bins
+        self.counts = np.zeros((size, bins), dtype=np.int64)
+
+    def add(self, scores, covered=None):
+        # scores: learners x ordinals achievements (one row per learner); covered
+        # (same shape, bool) leaves out the cells of learners without statements
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, self.counts.shape[0])
+        bins = np.minimum((np.clip(scores, 0.0, 1.0) * self.bins).astype(np.int64), self.bins - 1)
+        ordinals = np.broadcast_to(np.arange(self.counts.shape[0]), bins.shape)
+        if covered is None:
+            ordinals, bins = ordinals.ravel(), bins.ravel()
+        else:
+            covered = np.asarray(covered, dtype=bool).reshape(bins.shape)
+            ordinals, bins = ordinals[covered], bins[covered]
+        np.add.at(self.counts, (ordinals, bins), 1)
+        return self
+
+    def merge(self, other):
+        if other.counts.shape != self.counts.shape:
+            raise ValueError(f"cannot merge histograms of shape {other.counts.shape} into {self.counts.shape}")
+        self.counts += other.counts
+        return self
+
+    def totals(self):
+        return self.counts.sum(axis=1)
+
+    def percentile(self, q):
+        # Achievement below which q percent of the learners fall, per ordinal (NaN without learners)
+        totals = self.totals()
+        target = totals * (q / 100.0)
+        cumulative = np.cumsum(self.counts, axis=1)
+        index = np.minimum((cumulative < target[:, None]).sum(axis=1), self.bins - 1)
+        rows = np.arange(len(index))
+        inside = self.counts[rows, index]
+        before = cumulative[rows, index] - inside
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(inside > 0, (target - before) / inside, 0.0)
+            return np.where(totals > 0, (index + fraction) / self.bins, np.nan)
+
+    def percentile_rank(self, scores):
+        # Percent of the learners scoring below each achievement (one per ordinal)
+        scores = np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0) * self.bins
+        index = np.minimum(scores.astype(np.int64), self.bins - 1)
+        rows = np.arange(len(index))
+        below = np.cumsum(self.counts, axis=1)[rows, index] - self.counts[rows, index]
+        totals = self.totals()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ranks = (below + self.counts[rows, index] * (scores - index)) / totals * 100.0
+        return np.where(totals > 0, ranks, np.nan)
+
+
+class CohortStatistics:
+    # Distribution of the per-learner achievements of a cohort: one ScoreHistogram
+    # per level of the competency model. Built from the results of
+    # greta score --by-learner, never from the statements.
+    #
+    # A learner only counts towards the facets they have statements for, and
+    # towards the areas and aspects with at least one such facet (level_coverage):
+    # the results fill the other facets with 0, which would drag every median of
+    # a sparsely covered facet down to 0.
+
+    def __init__(self, model, bins=DEFAULT_BINS):
+        self.model_key = model.key
+        self.bins = bins
+        self.learners = 0
+        self.histograms = {level: ScoreHistogram(size, bins) for level, size in level_sizes(model).items()}
+
+    def add(self, level_scores, coverage=None):
+        # level_scores: {level: learners x ordinals achievements}, coverage: the
+        # matching {level: learners x ordinals bool} of level_coverage
+        for level, scores in level_scores.items():
+            self.histograms[level].add(scores, None if coverage is None else coverage[level])
+        self.learners += len(next(iter(level_scores.values())))
+        return self
+
+    def merge(self, other):
+        if other.model_key != self.model_key:
+            raise ValueError(f"cannot merge cohort statistics of competency model {other.model_key} into {self.model_key}")
+        for level, histogram in self.histograms.items():
+            histogram.merge(other.histograms[level])
+        self.learners += other.learners
+        return self
+
+    def covered(self, level="facet"):
+        # Learners with statements, per ordinal
+        return self.histograms[level].totals()
+
+    def medians(self, level="facet"):
+        return self.histograms[level].percentile(50)
+
+    def percentile_ranks(self, level_scores):
+        # Where one learner stands: {level: percent of the cohort below, by ordinal}
+        return {level: self.histograms[level].percentile_rank(scores) for level, scores in level_scores.items()}
+
+    def document(self, model):
+        # The cohort document: percentiles and the histogram of every facet, area and aspect
+        document = {"learners": self.learners, "bins": self.bins}
+        names = {
+            "facet": [model.facet_path(k) for k in range(len(model.facet_ids))],
+            "area": [model.area_path(j) for j in range(len(model.area_ids))],
+            "aspect": list(model.aspect_names),
+        }
+        for level, key in (("facet", "Facet Distributions"), ("area", "Area Distributions"), ("aspect", "Aspect Distributions")):
+            histogram = self.histograms[level]
+            percentiles = {q: histogram.percentile(q) for q in PERCENTILES}
+            covered = histogram.totals()
+            document[key] = [
+                {
+                    "id": name,
+                    "learners": int(covered[ordinal]),
+                    "median": optional_float(percentiles[50][ordinal]),
+                    "quartiles": [optional_float(percentiles[25][ordinal]), optional_float(percentiles[75][ordinal])],
+                    "percentiles": {f"p{q}": optional_float(percentiles[q][ordinal]) for q in PERCENTILES},
+                    "histogram": histogram.counts[ordinal].tolist(),
+                }
+                for ordinal, name in enumerate(names[level])
+            ]
+        return document
+
+    def save(self, file_path):
+        # The histograms as .npz, to be merged into later runs with load()
+        np.savez(file_path, model=np.array(self.model_key, dtype=str), bins=self.bins, learners=self.learners,
+                 **{level: histogram.counts for level, histogram in self.histograms.items()})
+
+    @classmethod
+    def load(cls, file_path, model):
+        with np.load(file_path) as data:
+            if tuple(data["model"].tolist()) != model.key:
+                raise ValueError(f"{file_path} was computed for competency model {tuple(data['model'].tolist())}, "
+                                 f"not {model.key}")
+            statistics = cls(model, int(data["bins"]))
+            statistics.learners = int(data["learners"])
+            for level, histogram in statistics.histograms.items():
+                histogram.counts[...] = data[level]
+        return statistics
+
+
+def optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def level_coverage(model, facet_counts):
+    # {level: learners x ordinals bool}: facets with statements, areas with such a
+    # facet, aspects with such an area
+    facets = np.asarray(facet_counts) > 0
+    areas = np.zeros((len(facets), len(model.area_ids)), dtype=bool)
+    for j in range(len(model.area_ids)):
+        area_facets = model.area_facets(j)
+        if len(area_facets):
+            areas[:, j] = facets[:, area_facets.start:area_facets.stop].any(axis=1)
+    aspects = np.zeros((len(facets), len(model.aspect_ids)), dtype=bool)
+    for i in range(len(model.aspect_ids)):
+        aspect_areas = model.aspect_areas(i)
+        if len(aspect_areas):
+            aspects[:, i] = areas[:, aspect_areas.start:aspect_areas.stop].any(axis=1)
+    return {"facet": facets, "area": areas, "aspect": aspects}
+
+
+def results_level_scores(file_path, model):
+    # (learners, {level: learners x ordinals achievements}, level_coverage) of a
+    # results file of greta score: a binary file or a JSON document, per
+    # learner or not
+    if is_results_file(file_path):
+        with ResultsFile(file_path) as results:
+            results.check_model(model)
+            return (list(results.learners), {level: results.columns[column].copy() for level, column in LEVEL_COLUMNS.items()},
+                    level_coverage(model, results.columns["facet_count"]))
+    with open(file_path, 'r', encoding='utf-8') as f:
+        output_data = json.load(f)
+    learners, arrays = results_arrays(model, output_data, "Facet Scores" not in output_data)
+    return (learners, {level: arrays[column] for level, column in LEVEL_COLUMNS.items()},
+            level_coverage(model, arrays["facet_count"]))
+
+
+def cohort_statistics(file_paths, model, bins=DEFAULT_BINS):
+    # Merged statistics of results files (e.g. one per shard or time window) and
+    # of histograms saved earlier (*.npz)
+    statistics = CohortStatistics(model, bins)
+    for file_path in file_paths:
+        if file_path.endswith('.npz'):
+            statistics.merge(CohortStatistics.load(file_path, model))
+        else:
+            statistics.add(*results_level_scores(file_path, model)[1:])
+    return statistics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cohort percentiles and histograms of per-learner results.")
+    parser.add_argument("inputs", nargs="+", help="results of greta score --by-learner (JSON or binary), "
+                                                  "or histograms saved with --save (*.npz); all are merged")
+    parser.add_argument("-o", "--output", default="greta_cohort.json")
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS, help="histogram bins over 0..1")
+    parser.add_argument("--save", metavar="NPZ", help="also save the merged histograms for later merges")
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    args = parser.parse_args()
+
+    model = load_competency_model(args.model)
+    statistics = cohort_statistics(args.inputs, model, args.bins)
+    if args.save:
+        statistics.save(args.save)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(statistics.document(model), f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
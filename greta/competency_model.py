@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import re
+
+# The GRETA model shipped with the package
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'greta_kompetenzmodell_2-0_1.json')
+# Compiled models are cached per user, never in the working directory
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'greta')
+
+# Bump when the layout or lookup_key of CompetencyModel changes so stale caches are ignored
+CACHE_FORMAT = 6
+
+# Facets that are only announced in the model ("TBD") and cannot be scored yet
+PLACEHOLDER_IDS = {"TBD"}
+
+LEVELS = ("aspect", "area", "facet")
+
+# How competencePath and the IDs of the model spell umlauts, e.g. "Koennen"
+TRANSLITERATION = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'Ä': 'Ae', 'Ö': 'Oe', 'Ü': 'Ue', 'ß': 'ss'})
+
+
+def clean_name(name):
+    # Names in the model carry the line breaks of the printed wheel, e.g.
+    # "Teilnehmenden-\norientierung" or "Beratung/\nIndividualisierte Lernunterstützung"
+    name = re.sub(r'-\n(?=[a-zäöüß])', '', name)
+    name = re.sub(r'/\n', '/', name)
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def lookup_key(text):
+    # Case, whitespace and punctuation insensitive key, the same equivalence the
+    # charts used to get from normalize_id; umlauts are transliterated so that
+    # "Können" and "Koennen" meet
+    return re.sub(r'\W', '', text.translate(TRANSLITERATION)).casefold()
+
+
+class CompetencyModel:
+    # The competency model compiled into integer ordinals. Aspects, areas and
+    # facets are numbered depth-first in model order, so the children of a node
+    # form a contiguous ordinal range:
+    #   areas of aspect i  -> range(area_offsets[i], area_offsets[i + 1])
+    #   facets of area j   -> range(facet_offsets[j], facet_offsets[j + 1])
+    # facet_area and area_aspect hold the parent ordinal of every node.
+
+    def __init__(self, model_data):
+        tree = model_data['Kompetenzmodell']
+        self.id = tree['ID']
+        self.name = tree['Name']
+        self.version = tree['Version']
+        # Digest of the model file the model was compiled from (see load_competency_model)
+        self.digest = None
+
+        self.aspect_ids, self.aspect_names, self.aspect_labels = [], [], []
+        self.area_ids, self.area_names, self.area_labels, self.area_aspect = [], [], [], []
+        self.facet_ids, self.facet_names, self.facet_labels, self.facet_area = [], [], [], []
+        self.facet_descriptions = []
+        self.area_offsets, self.facet_offsets = [0], [0]
+        # Number of placeholder facets per area; they are drawn but never scored
+        self.area_placeholders = []
+
+        for aspect in tree['Kompetenzaspekte']:
+            aspect_ordinal = len(self.aspect_ids)
+            self.aspect_ids.append(aspect['ID'])
+            self.aspect_names.append(clean_name(aspect['Name']))
+            self.aspect_labels.append(aspect['Name'])
+            for area in aspect.get('Kompetenzbereiche', []):
+                area_ordinal = len(self.area_ids)
+                self.area_ids.append(area['ID'])
+                self.area_names.append(clean_name(area['Name']))
+                self.area_labels.append(area['Name'])
+                self.area_aspect.append(aspect_ordinal)
+                placeholders = 0
+                for facet in area.get('Kompetenzfacetten', []):
+                    if facet['ID'] in PLACEHOLDER_IDS:
+                        placeholders += 1
+                        continue
+                    self.facet_ids.append(facet['ID'])
+                    self.facet_names.append(clean_name(facet['Name']))
+                    self.facet_labels.append(facet['Name'])
+                    self.facet_descriptions.append('\n'.join(facet.get('Kompetenzanforderungen', [])))
+                    self.facet_area.append(area_ordinal)
+                self.area_placeholders.append(placeholders)
+                self.facet_offsets.append(len(self.facet_ids))
+            self.area_offsets.append(len(self.area_ids))
+
+        self._index = {level: {} for level in LEVELS}
+        self._build_index()
+        # The IDs results documents use, by ordinal
+        self.paths = {
+            "aspect": list(self.aspect_names),
+            "area": [self.area_path(j) for j in range(len(self.area_ids))],
+            "facet": [self.facet_path(k) for k in range(len(self.facet_ids))],
+        }
+
+    def _build_index(self):
+        # Every node is reachable by its name, its ID and its path of names or IDs,
+        # with or without the model ID in front (as in competencePath)
+        for i in range(len(self.aspect_ids)):
+            self._register("aspect", i, [self.aspect_names[i]], [self.aspect_ids[i]])
+        for j in range(len(self.area_ids)):
+            i = self.area_aspect[j]
+            self._register("area", j,
+                           [self.aspect_names[i], self.area_names[j]],
+                           [self.aspect_ids[i], self.area_ids[j]])
+        for k in range(len(self.facet_ids)):
+            j = self.facet_area[k]
+            i = self.area_aspect[j]
+            self._register("facet", k,
+                           [self.aspect_names[i], self.area_names[j], self.facet_names[k]],
+                           [self.aspect_ids[i], self.area_ids[j], self.facet_ids[k]])
+
+    def _register(self, level, ordinal, name_path, id_path):
+        index = self._index[level]
+        for key in (name_path[-1], id_path[-1]):
+            index.setdefault(lookup_key(key), ordinal)
+        for path in (name_path, id_path, [self.id] + id_path):
+            index[lookup_key('/'.join(path))] = ordinal
+
+    @property
+    def key(self):
+        return self.id, self.version
+
+    def ordinal(self, level, text):
+        # O(1) lookup of a name, ID or path on one level; None when unknown
+        return self._index[level].get(lookup_key(text))
+
+    def ordinals(self, level, texts):
+        # Ordinals of a list of IDs (None for unknown ones). Results list every
+        # node in model order, which one list comparison confirms; only other
+        # lists are looked up ID by ID.
+        texts = list(texts)
+        if texts == self.paths[level]:
+            return range(len(texts))
+        return [self.ordinal(level, text) for text in texts]
+
+    def lookup(self, text):
+        # Resolve text on any level, most specific first; returns (level, ordinal) or None
+        key = lookup_key(text)
+        for level in reversed(LEVELS):
+            ordinal = self._index[level].get(key)
+            if ordinal is not None:
+                return level, ordinal
+        return None
+
+    def area_facets(self, area_ordinal):
+        return range(self.facet_offsets[area_ordinal], self.facet_offsets[area_ordinal + 1])
+
+    def aspect_areas(self, aspect_ordinal):
+        return range(self.area_offsets[aspect_ordinal], self.area_offsets[aspect_ordinal + 1])
+
+    def facet_path(self, facet_ordinal):
+        area_ordinal = self.facet_area[facet_ordinal]
+        return f"{self.area_path(area_ordinal)}/{self.facet_names[facet_ordinal]}"
+
+    def area_path(self, area_ordinal):
+        return f"{self.aspect_names[self.area_aspect[area_ordinal]]}/{self.area_names[area_ordinal]}"
+
+    def hierarchy(self):
+        # The aspect -> area -> [facet] dict used by generate_mapping
+        return {
+            self.aspect_names[i]: {
+                self.area_names[j]: [self.facet_names[k] for k in self.area_facets(j)]
+                for j in self.aspect_areas(i)
+            }
+            for i in range(len(self.aspect_ids))
+        }
+
+
+# (ID, Version) -> model, and file path -> ((mtime, size), model)
+_loaded_models = {}
+_model_files = {}
+
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_competency_model(file_path=MODEL_FILE, cache_dir=CACHE_DIR):
+    # Compile the model once: per process it is kept in memory, across processes
+    # its compiled state is cached in cache_dir under its ID and Version (None
+    # turns that off). Both caches are checked
+    # against the file, so an edited model is recompiled even when its ID and
+    # Version stay the same: in memory by mtime and size (a stat per call), on
+    # disk by a digest of the content, which model.digest carries along.
+    signature = file_signature(file_path)
+    loaded = _model_files.get(file_path)
+    if loaded is not None and loaded[0] == signature:
+        return loaded[1]
+
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(content).hexdigest()
+    model_data = json.loads(content)
+    tree = model_data['Kompetenzmodell']
+    key = (tree['ID'], tree['Version'])
+    model = _loaded_models.get(key)
+    if model is None or model.digest != digest:
+        model = load_cached_model(model_data, digest, cache_dir)
+        _loaded_models[key] = model
+    _model_files[file_path] = (signature, model)
+    return model
+
+
+def load_cached_model(model_data, digest, cache_dir=CACHE_DIR):
+    # The cache holds the attributes of the model as plain JSON, so reading it
+    # runs no code whatever is in the file. It is only a shortcut: a cache that
+    # cannot be read, is stale or cannot be written is a miss.
+    tree = model_data['Kompetenzmodell']
+    cache_path = None
+    if cache_dir:
+        name = re.sub(r'[^\w.-]', '_', f"{tree['ID']}-{tree['Version']}-{CACHE_FORMAT}")
+        cache_path = os.path.join(cache_dir, f"{name}.json")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state["digest"] == digest:
+                model = CompetencyModel.__new__(CompetencyModel)
+                model.__dict__.update(state)
+                return model
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    model = CompetencyModel(model_data)
+    model.digest = digest
+    if cache_path:
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                json.dump(model.__dict__, f, ensure_ascii=False)
+            os.replace(temporary_path, cache_path)
+        except OSError:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+    return model
@@ -0,0 +1,709 @@
+import argparse
+import gzip
+import json
+import re
+import sys
+from collections import Counter
+
+from .accumulators import FacetAccumulator, WeightedFacetAccumulator
+from .competency_model import MODEL_FILE, load_competency_model, lookup_key
+from .instrumentation import PROFILE_MODES, Metrics, profiled, timed
+from .recommendations import resource_catalog
+from .weighting import ROLLUPS, WEIGHTINGS
+
+# Size of the text chunks read from the export while streaming
+STREAM_CHUNK_SIZE = 1 << 16
+# What may still follow a decoded value up to the end of the buffer when it is a
+# number cut by the chunk boundary ("12" of "12345", "5e" of "5e-11")
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+# A decode error this far before the end of the buffer is in the data itself:
+# no literal ("-Infinity"), number or \uXXXX escape cut at the end reaches back so far
+DECODE_LOOKAHEAD = 16
+
+VOIDED_VERB = "http://adlnet.gov/expapi/verbs/voided"
+# Profile key used when statements are not grouped by learner
+ALL_LEARNERS = ""
+
+def load_xapi_data(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        xapi_data = json.load(file)
+    return xapi_data
+
+def open_xapi_file(file_path):
+    # gzip exports are recognised by their magic bytes, not by the file extension
+    with open(file_path, 'rb') as probe:
+        magic = probe.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+def iter_json_values(file, chunk_size=STREAM_CHUNK_SIZE, on_error=None):
+    # Decode the elements of a top-level JSON array (a Learning Locker export) or a
+    # sequence of JSON documents (NDJSON / JSON lines) one at a time, so that only
+    # the element being decoded and one read chunk are held in memory.
+    # With on_error(text, error), a line of a document sequence or an element of
+    # the array that is not valid JSON is handed to it and skipped instead of
+    # ending the stream. Without, the first such error is raised as soon as more
+    # input could no longer change it, not at the end of the file.
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    eof = not buffer
+    pos = 0
+    in_array = None
+    while True:
+        # Skip whitespace and the separators between elements, refilling as needed
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer = file.read(chunk_size)
+            eof = not buffer
+            pos = 0
+        if pos >= len(buffer):
+            return
+        if in_array is None:
+            in_array = buffer[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if in_array and buffer[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # A number that runs to the end of the buffer may go on in the next
+            # chunk: read more and decode it again
+            while not eof and NUMBER_TAIL.match(buffer, end):
+                more = file.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                value, end = decoder.raw_decode(buffer, pos)
+            pos = end
+        except json.JSONDecodeError as error:
+            # An error well before the end of the buffer, or in a line of a
+            # document sequence before its last, still incomplete line, is in the
+            # data itself; more data would not help. An unterminated string may
+            # just go on in the next chunk.
+            in_data = eof or (not error.msg.startswith("Unterminated string")
+                              and error.pos + DECODE_LOOKAHEAD <= len(buffer))
+            if not in_data and on_error is not None and not in_array:
+                in_data = error.pos <= buffer.rfind('\n')
+            if not in_data:
+                # The element continues past the end of the buffer: drop what has
+                # already been consumed and read more
+                more = file.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            if on_error is None:
+                raise
+            # Skip the line or the array element, reading on until its end
+            while True:
+                end = value_end(buffer, pos) if in_array else buffer.find('\n', pos)
+                if end >= 0 or eof:
+                    break
+                more = file.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+            end = len(buffer) if end < 0 else end
+            on_error(buffer[pos:end], error)
+            pos = end
+            continue
+        yield value
+
+def value_end(text, start):
+    # End of the array element at text[start:] judged by brackets and strings
+    # alone, for skipping an element that does not decode: after its closing
+    # bracket, or at the comma or bracket that ends a bare value. -1 when the
+    # element goes on past the end of text.
+    depth = 0
+    in_string = False
+    index = start
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            if char == '\\':
+                index += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            if depth == 0:
+                return index
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        elif char == ',' and depth == 0:
+            return index
+        index += 1
+    return -1
+
+def slim_activity(activity):
+    # Keep only the parts of a statement the scoring looks at and drop the LRS
+    # envelope (completedQueues, hash, authority, ...). Bare xAPI statements, as
+    # found in NDJSON dumps of the statements API, are accepted as well.
+    # Identity, times and verb are kept for the state store and time-aware scoring;
+    # voiding statements carry no score and only keep the statement they void.
+    statement = activity["statement"] if "statement" in activity else activity
+    verb = statement["verb"]["id"] if "verb" in statement else None
+    if verb == VOIDED_VERB:
+        slim = slim_statement(activity, statement, verb)
+        slim["statement"]["object"] = {"objectType": "StatementRef", "id": statement["object"]["id"]}
+        return slim
+    return slim_statement(activity, statement, verb, statement["context"]["extensions"]["learningObjectMetadata"],
+                          statement["result"]["score"])
+
+def slim_statement(activity, statement, verb, metadata=None, score=None):
+    # The slimmed activity from parts that were already looked up
+    slim = {
+        "id": statement.get("id"),
+        "stored": statement.get("stored", activity.get("stored")),
+        "actor": statement.get("actor"),
+        "verb": {"id": verb} if verb is not None else None,
+        "timestamp": statement.get("timestamp"),
+    }
+    if metadata is not None:
+        slim["context"] = {"extensions": {"learningObjectMetadata": metadata}}
+        slim["result"] = {"score": score}
+    # Learning Locker flags statements that were voided later on the envelope
+    return {"statement": slim, "voided": activity.get("voided", False)}
+
+def iter_xapi_data(file_path, metrics=None, validator=None):
+    # Streaming counterpart of load_xapi_data: yields slimmed activities one at a
+    # time from a JSON array export, an NDJSON file or a gzip of either.
+    # With metrics, statements are counted and malformed ones skipped; with a
+    # validator (ingestion.StatementValidator), it decides what is passed on.
+    with open_xapi_file(file_path) as file:
+        on_error = validator.reject_line if validator is not None else None
+        for activity in iter_json_values(file, on_error=on_error):
+            if metrics is not None:
+                metrics.count("statements_read")
+            if validator is not None:
+                slim = validator(activity)
+                if slim is not None:
+                    yield slim
+                continue
+            if metrics is None:
+                yield slim_activity(activity)
+                continue
+            try:
+                slim = slim_activity(activity)
+            except (KeyError, TypeError, AttributeError):
+                metrics.count("statements_malformed")
+                continue
+            yield slim
+
+def normalize_score(score):
+    min_score = score["min"]
+    max_score = score["max"]
+    raw_score = score["raw"]
+    return (raw_score - min_score) / (max_score - min_score)
+
+def learner_id(actor):
+    # Identify a learner by the inverse functional identifier of the xAPI actor,
+    # accounts are written as "homePage|name" like the "agents" field of Learning Locker
+    if "account" in actor:
+        account = actor["account"]
+        return f'{account["homePage"]}|{account["name"]}'
+    for key in ("mbox", "mbox_sha1sum", "openid"):
+        if key in actor:
+            return actor[key]
+    raise KeyError("statement.actor has no account, mbox, mbox_sha1sum or openid")
+
+def facet_ordinals(competency_hierarchy):
+    # Number the facets of the hierarchy in order; facets that only show up in the
+    # statements get the following ordinals as they are encountered
+    return {
+        facet: ordinal
+        for ordinal, facet in enumerate(
+            facet
+            for areas in competency_hierarchy.values()
+            for facets in areas.values()
+            for facet in facets
+        )
+    }
+
+class FacetResolver:
+    # Maps the learningObjectMetadata of a statement onto a facet ordinal. The
+    # canonical competencePath is tried first (with or without the model ID in
+    # front), then the facet name. Both go through lookup_key, so umlauts spelled
+    # "oe"/"ue", case, spacing and punctuation do not matter. Results are memoized
+    # per (competencePath, facet) pair, so after the first statement of a spelling
+    # resolving is a single dict lookup.
+    #
+    # Statements that match no facet of the hierarchy get ordinals after the known
+    # ones, under their facet name, and are counted in unresolved by competencePath
+    # (or facet name when there is no path).
+
+    def __init__(self, competency_hierarchy):
+        self.ordinals = facet_ordinals(competency_hierarchy)
+        self.facets = list(self.ordinals)
+        self.known = len(self.ordinals)
+        self.unresolved = Counter()
+        self._keys = {}
+        for aspect, areas in competency_hierarchy.items():
+            for area, facets in areas.items():
+                for facet in facets:
+                    ordinal = self.ordinals[facet]
+                    self._keys.setdefault(lookup_key(facet), ordinal)
+                    self._keys[lookup_key(f"{aspect}/{area}/{facet}")] = ordinal
+        self._memo = {}
+
+    def ordinal(self, metadata):
+        key = (metadata.get("competencePath"), metadata.get("facet"))
+        ordinal = self._memo.get(key)
+        if ordinal is None:
+            ordinal = self._memo[key] = self._resolve(*key)
+        if ordinal >= self.known:
+            self.unresolved[key[0] or key[1]] += 1
+        return ordinal
+
+    def facet(self, metadata):
+        # Canonical (hierarchy) name of the facet of a statement
+        return self.facets[self.ordinal(metadata)]
+
+    def _resolve(self, path, facet):
+        if path:
+            segments = path.split('/')
+            for start in (0, 1):
+                ordinal = self._keys.get(lookup_key(''.join(segments[start:])))
+                if ordinal is not None:
+                    return ordinal
+        if facet:
+            ordinal = self._keys.get(lookup_key(facet))
+            if ordinal is not None:
+                return ordinal
+        if facet is None and path is None:
+            raise KeyError("learningObjectMetadata has neither competencePath nor facet")
+        return self.add_facet(facet or path)
+
+    def add_facet(self, name):
+        # Ordinal of a facet outside the hierarchy, numbered on first sight
+        ordinal = self.ordinals.get(name)
+        if ordinal is None:
+            ordinal = self.ordinals[name] = len(self.ordinals)
+            self.facets.append(name)
+        return ordinal
+
+def add_activity_score(activity, accumulator, resolver, weighting=None):
+    # Fold the sub-competency (facet) score of one xAPI activity into the accumulator;
+    # with a weighting (see weighting.WEIGHTINGS) into a WeightedFacetAccumulator
+    statement = activity["statement"]
+    metadata = statement["context"]["extensions"]["learningObjectMetadata"]
+    ordinal = resolver.ordinal(metadata)
+    score = normalize_score(statement["result"]["score"])
+    if weighting is None:
+        accumulator.add(ordinal, score)
+    else:
+        accumulator.add(ordinal, score, weighting(metadata))
+
+def new_accumulator(size, weighting=None):
+    return FacetAccumulator(size) if weighting is None else WeightedFacetAccumulator(size)
+
+def map_activities_to_competencies(xapi_activities, competency_hierarchy, mapping_table_resource, metrics=None, resolver=None,
+                                   weighting=None, rollup=None):
+    # Extract the sub-competency (facet) scores from the xAPI data; pass a
+    # FacetResolver to see the statements that matched no facet afterwards.
+    # weighting weighs every statement, rollup (see weighting.ROLLUPS) combines
+    # facets into areas and aspects; both default to plain means.
+    resolver = resolver or FacetResolver(competency_hierarchy)
+    ordinals = resolver.ordinals
+    known_facets = resolver.known
+    accumulator = new_accumulator(known_facets, weighting)
+    with timed(metrics, "aggregate"):
+        for activity in xapi_activities:
+            add_activity_score(activity, accumulator, resolver, weighting)
+    if metrics is not None:
+        metrics.count("statements_scored", sum(accumulator.counts))
+        metrics.record_facet_misses(ordinals, [accumulator], known_facets)
+    with timed(metrics, "roll_up"):
+        return summarize_competencies(accumulator, ordinals, competency_hierarchy, mapping_table_resource, rollup)
+
+def map_activities_by_learner(xapi_activities, competency_hierarchy, mapping_table_resource, metrics=None, resolver=None,
+                              weighting=None, rollup=None):
+    # Same as map_activities_to_competencies, but with one profile per statement.actor.
+    # All learners are collected in a single scan over the statements.
+    resolver = resolver or FacetResolver(competency_hierarchy)
+    ordinals = resolver.ordinals
+    known_facets = resolver.known
+    learner_accumulators = {}
+    with timed(metrics, "aggregate"):
+        for activity in xapi_activities:
+            learner = learner_id(activity["statement"]["actor"])
+            if learner not in learner_accumulators:
+                learner_accumulators[learner] = new_accumulator(known_facets, weighting)
+            add_activity_score(activity, learner_accumulators[learner], resolver, weighting)
+    if metrics is not None:
+        metrics.count("statements_scored", sum(sum(accumulator.counts) for accumulator in learner_accumulators.values()))
+        metrics.record_facet_misses(ordinals, learner_accumulators.values(), known_facets)
+
+    with timed(metrics, "roll_up"):
+        return {
+            learner: summarize_competencies(accumulator, ordinals, competency_hierarchy, mapping_table_resource, rollup)
+            for learner, accumulator in learner_accumulators.items()
+        }
+
+def results_from_accumulators(learner_accumulators, ordinals, competency_hierarchy, mapping_table_resource, by_learner):
+    # Output document for accumulators that were collected outside of the
+    # map_activities_* functions; without by_learner all learners are merged
+    if by_learner:
+        return {
+            learner: results_document(*summarize_competencies(accumulator, ordinals, competency_hierarchy, mapping_table_resource))
+            for learner, accumulator in learner_accumulators.items()
+        }
+    merged = FacetAccumulator(len(ordinals))
+    for accumulator in learner_accumulators.values():
+        merged.merge(accumulator)
+    return results_document(*summarize_competencies(merged, ordinals, competency_hierarchy, mapping_table_resource))
+
+def summarize_competencies(accumulator, ordinals, competency_hierarchy, mapping_table_resource, rollup=None):
+    # Calculate the average scores for each sub-competency (facet); facets of the
+    # hierarchy without statements default to a score of 0
+    sub_competency_averages = {facet: accumulator.mean(ordinal) for facet, ordinal in ordinals.items()}
+
+    # Calculate the average scores for each area and main competency
+    area_averages = {}
+    aspect_averages = {}
+    area_weights = {}
+    
+    for aspect, areas in competency_hierarchy.items():
+        for area, facets in areas.items():
+            relevant_scores = [sub_competency_averages[facet] for facet in facets]
+            if rollup is None:
+                area_averages[area] = sum(relevant_scores)/len(relevant_scores) if relevant_scores else 0
+            else:
+                area_averages[area], area_weights[area] = rollup(relevant_scores, [accumulator.weight(ordinals[facet]) for facet in facets])
+        
+        relevant_area_scores = [area_averages[area] for area in areas]
+        if rollup is None:
+            aspect_averages[aspect] = sum(relevant_area_scores)/len(relevant_area_scores) if relevant_area_scores else 0
+        else:
+            aspect_averages[aspect], _ = rollup(relevant_area_scores, [area_weights[area] for area in areas])
+
+    # Create the GRETA competencies structure with full paths and scores
+    facet_scores = [
+        {
+            "id": f"{aspect}/{area}/{facet}",
+            "achievement": sub_competency_averages[facet],
+            "count": accumulator.count(ordinals[facet]),
+            "variance": accumulator.variance(ordinals[facet]),
+            "stddev": accumulator.stddev(ordinals[facet]),
+        }
+        for aspect, areas in competency_hierarchy.items()
+        for area, facets in areas.items()
+        for facet in facets
+    ]
+    
+    # Create the area and main competency scores structure
+    area_scores = [
+        {"id": f"{aspect}/{area}", "achievement": area_averages[area]}
+        for aspect, areas in competency_hierarchy.items()
+        for area in areas
+    ]
+    
+    aspect_scores = [
+        {"id": f"{aspect}", "achievement": aspect_averages[aspect]}
+        for aspect in competency_hierarchy
+    ]
+
+    # Learning resource links for the sub-competencies (facets) with scores below 0.5,
+    # weakest first; mapping_table_resource is a {facet: link} table or a ResourceCatalog.
+    # Facets outside the hierarchy are reported by FacetResolver and get no link
+    low_score_links = resource_catalog(mapping_table_resource).low_score_links({
+        facet: sub_competency_averages[facet]
+        for areas in competency_hierarchy.values() for facets in areas.values() for facet in facets
+    })
+    
+    return facet_scores, area_scores, aspect_scores, low_score_links
+
+def results_document(facet_scores, area_scores, aspect_scores, low_score_links):
+    return {
+        "Facet Scores": facet_scores,
+        "Area Scores": area_scores,
+        "Aspect Scores": aspect_scores,
+        #"Low Score Links": low_score_links
+    }
+
+mapping_table_resource = {
+    "Enthusiasmus": "http://example.com/Enthusiasmus",
+    "Selbstwirksamkeitsüberzeugungen": "http://example.com/Selbstwirksamkeitsüberzeugungen",
+    "Engagement und Distanz": "http://example.com/Engagement",
+    "Umgang mit Feedback und Kritik": "http://example.com/Umgang",
+    "Reflexion des eigenen Lehrhandelns": "http://example.com/Reflexion",
+    "Berufliche Weiterentwicklung": "http://example.com/Berufliche",
+    "Menschenbilder": "http://example.com/Menschenbilder",
+    "Wertvorstellungen": "http://example.com/Wertvorstellungen",
+    "Eigenes Rollenbewusstsein": "http://example.com/Eigenes",
+    "Subjektive Annahmen über das Lehren und Lernen": "http://example.com/Subjektive",
+    "Kooperation mit den Auftraggebenden/Arbeitgebenden": "http://example.com/Kooperation",
+    "Kollegiale Zusammenarbeit/Netzwerken": "http://example.com/Kollegiale",
+    "Lerninhalte und -ziele": "http://example.com/Lerninhalte",
+    "Methoden, Medien und Lernmaterialien": "http://example.com/Methoden",
+    "Outcomeorientierung": "http://example.com/Outcomeorientierung",
+    "Rahmenbedingungen und Lernumgebungen": "http://example.com/Rahmenbedingungen",
+    "Moderation und Steuerung von Gruppen": "http://example.com/Moderation",
+    "Professionelle Kommunikation": "http://example.com/Professionelle",
+    "Diagnostik und Lernberatung": "http://example.com/Diagnostik",
+    "Teilnehmendenorientierung": "http://example.com/Teilnehmendenorientierung",
+    "Curriculare und institutionelle Rahmenbedingungen": "http://example.com/Curriculare",
+    "Feldspezifisches Wissen": "http://example.com/Feldspezifisches",
+    "Adressatinnen und Adressaten": "http://example.com/Adressaten",
+}
+
+def parse_arguments(argv=None):
+    # The options of greta score (sys.argv without argv), checked for combinations
+    # the engines do not support
+    parser = argparse.ArgumentParser(description="Map xAPI statements onto GRETA competency scores.")
+    parser.add_argument("xapi_files", nargs="*", default=["greta_xapi_example1.json"],
+                        help="JSON array exports, NDJSON files or gzips of either")
+    parser.add_argument("-o", "--output", help="default: greta_results.json, or greta_results.grr with --format binary")
+    parser.add_argument("--format", choices=("json", "binary"), default="json",
+                        help="pretty-printed JSON, or the memory-mappable results file of greta export")
+    parser.add_argument("--model", nargs="+", default=[MODEL_FILE],
+                        help="competency model JSON; with several models every statement is scored against the "
+                             "model its competencePath or tree names (the first by default), keyed by model ID")
+    parser.add_argument("--by-learner", action="store_true",
+                        help="write one profile per learner (statement.actor), keyed by learner")
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python",
+                        help="aggregate with the per-facet Python loop or the vectorized NumPy engine")
+    parser.add_argument("--state", metavar="SQLITE",
+                        help="incremental mode: fold only statements not seen before into this "
+                             "aggregate store and write the results from it")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="accumulate in a pool of this many processes; NDJSON files are split "
+                             "into byte ranges, other exports are handed out file by file")
+    over_time = parser.add_mutually_exclusive_group()
+    over_time.add_argument("--half-life", type=float, metavar="DAYS",
+                           help="decay-weighted scores: a statement counts half as much per DAYS it is "
+                                "older than the newest statement of its facet")
+    over_time.add_argument("--window", type=float, metavar="DAYS",
+                           help="scores over the last DAYS up to --as-of (sliding window of --bucket wide buckets)")
+    over_time.add_argument("--tumbling", type=float, metavar="DAYS",
+                           help="one results document per consecutive DAYS window, keyed by window start")
+    over_time.add_argument("--trend", type=float, metavar="DAYS",
+                           help="facet progress: means per DAYS bucket and the fitted slope per day")
+    parser.add_argument("--bucket", type=float, default=1.0, metavar="DAYS", help="bucket width of --window")
+    parser.add_argument("--as-of", metavar="TIMESTAMP", help="end of --window (default: the newest statement)")
+    parser.add_argument("--weighting", choices=sorted(WEIGHTINGS),
+                        help="weigh every statement by its learningObjectMetadata (credits, level, "
+                             "typicalLearningTime) instead of counting all the same")
+    parser.add_argument("--rollup", choices=sorted(ROLLUPS),
+                        help="how facets combine into areas and aspects: mean of the children (default) "
+                             "or weighted by the statements behind them")
+    parser.add_argument("--quarantine", metavar="FILE",
+                        help="write rejected statements with the reason to FILE (NDJSON); they are "
+                             "skipped and counted either way")
+    parser.add_argument("--verbs", nargs="+", metavar="VERB",
+                        help="score only statements with these verbs (IRIs or ADL names, e.g. answered completed)")
+    parser.add_argument("--no-clamp", action="store_true",
+                        help="reject raw scores outside [min, max] instead of clamping them")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write stage timings and statement counters to FILE (Prometheus text for "
+                             "*.prom, JSON otherwise)")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="capture a profile of the scoring into <output>.prof or <output>.tracemalloc.txt")
+    args = parser.parse_args(argv)
+    if args.state and args.engine != "python":
+        parser.error("--state aggregates with the python engine")
+    if args.workers and (args.state or args.engine != "python"):
+        parser.error("--workers aggregates with the python engine and without --state")
+    time_mode = args.half_life or args.window or args.tumbling or args.trend
+    if time_mode is not None and (time_mode <= 0 or args.bucket <= 0):
+        parser.error("time spans must be positive")
+    if time_mode and (args.workers or args.state or args.engine != "python"):
+        parser.error("time-aware scoring aggregates with the python engine, without --workers and --state")
+    if (args.weighting or args.rollup) and (time_mode or args.workers or args.state or args.engine != "python"):
+        parser.error("--weighting and --rollup aggregate with the python engine, without time modes, --workers and --state")
+    if (args.tumbling or args.trend) and args.format == "binary":
+        parser.error("--tumbling and --trend are written as JSON")
+    if len(args.model) > 1 and (args.format == "binary" or args.engine != "python" or args.state or args.workers or time_mode
+                                or args.weighting or args.rollup):
+        parser.error("several --model files are scored as JSON with the python engine, without --state, --workers, "
+                     "time modes, --weighting and --rollup")
+    args.output = args.output or ("greta_results.grr" if args.format == "binary" else "greta_results.json")
+    return args
+
+def statement_validator(args):
+    # The ingestion.StatementValidator for the options of parse_arguments
+    from .ingestion import StatementValidator
+    time_mode = args.half_life or args.window or args.tumbling or args.trend
+    return StatementValidator(args.verbs, clamp=not args.no_clamp, require_actor=args.by_learner or bool(args.state),
+                              quarantine=args.quarantine, voiding=bool(args.state), require_time=bool(time_mode),
+                              require_id=bool(args.state))
+
+def main():
+    args = parse_arguments()
+    metrics = Metrics() if args.metrics else None
+    with timed(metrics, "load_model"):
+        if len(args.model) > 1:
+            from .model_registry import ModelRegistry
+            try:
+                snapshot = ModelRegistry(args.model).snapshot
+            except ValueError as error:
+                sys.exit(f"greta score: {error}")
+        else:
+            model = load_competency_model(args.model[0])
+            competency_hierarchy = model.hierarchy()
+    validator = statement_validator(args)
+    xapi_activities = (activity for xapi_file in args.xapi_files for activity in iter_xapi_data(xapi_file, metrics, validator))
+    if metrics is not None:
+        xapi_activities = metrics.timed_iter("parse", xapi_activities)
+
+    with profiled(args.profile, args.output):
+        if len(args.model) > 1:
+            from .model_registry import score_by_model
+            with timed(metrics, "aggregate"):
+                output_data, resolvers = score_by_model(xapi_activities, snapshot, mapping_table_resource, args.by_learner, metrics)
+        else:
+            resolvers = [FacetResolver(competency_hierarchy)]
+            output_data = score_files(args, model, xapi_activities, resolvers[0], metrics, validator)
+    validator.close()
+    report_rejected(validator, args.quarantine, metrics)
+    for resolver in resolvers:
+        report_unresolved(resolver, metrics)
+
+    with timed(metrics, "serialize"):
+        if args.format == "binary":
+            from .results_file import write_arrays
+            write_arrays(args.output, model, *output_data, args.by_learner)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(output_data, f, ensure_ascii=False, indent=4)
+
+    if metrics is not None:
+        metrics.write(args.metrics)
+
+def report_rejected(validator, quarantine=None, metrics=None):
+    # Statements the validator kept out of the scores, by reason
+    total = sum(validator.rejected.values())
+    if metrics is not None:
+        metrics.count("statements_malformed", total)
+        metrics.count("statements_filtered", validator.filtered)
+        metrics.count("statements_clamped", validator.clamped)
+    if total:
+        where = f", see {quarantine}" if quarantine else ""
+        print(f"{total} statements were rejected{where}:", file=sys.stderr)
+        for reason, count in validator.rejected.most_common():
+            print(f"{count:10d}  {reason}", file=sys.stderr)
+    if validator.clamped:
+        print(f"{validator.clamped} scores outside [min, max] were clamped", file=sys.stderr)
+
+def report_unresolved(resolver, metrics=None):
+    # Statements whose competencePath and facet name match no facet of the model
+    # are listed on stderr instead of silently dropping out of the scores
+    total = sum(resolver.unresolved.values())
+    if metrics is not None:
+        metrics.count("statements_unresolved", total)
+    if total:
+        print(f"{total} statements could not be resolved onto the competency model:", file=sys.stderr)
+        for path, count in resolver.unresolved.most_common():
+            print(f"{count:10d}  {path}", file=sys.stderr)
+
+def score_files(args, model, xapi_activities, resolver, metrics=None, validator=None):
+    # The results document(s) of main() for the selected engine and mode. With
+    # --format binary the (learners, arrays) of results_file instead, read
+    # straight from the accumulators or the score matrix; only time-aware and
+    # weighted scores are converted from their documents.
+    binary = args.format == "binary"
+    competency_hierarchy = model.hierarchy()
+    weighting = WEIGHTINGS[args.weighting] if args.weighting else None
+    rollup = ROLLUPS[args.rollup] if args.rollup else None
+    if args.half_life or args.window or args.tumbling or args.trend:
+        from . import temporal_scoring
+        with timed(metrics, "aggregate"):
+            if args.half_life:
+                output_data = temporal_scoring.decayed_results(xapi_activities, competency_hierarchy, mapping_table_resource,
+                                                               args.half_life, args.by_learner, resolver, metrics)
+            elif args.window:
+                output_data = temporal_scoring.sliding_window_results(xapi_activities, competency_hierarchy, mapping_table_resource,
+                                                                      args.window, args.bucket, args.as_of, args.by_learner, resolver,
+                                                                      metrics)
+            elif args.tumbling:
+                return temporal_scoring.tumbling_window_results(xapi_activities, competency_hierarchy, mapping_table_resource,
+                                                                args.tumbling, args.by_learner, resolver, metrics)
+            else:
+                return temporal_scoring.trend_results(xapi_activities, competency_hierarchy, args.trend, args.by_learner, resolver, metrics)
+    elif args.workers:
+        from .parallel_scoring import score_in_parallel
+        with timed(metrics, "aggregate"):
+            ordinals, learner_accumulators = score_in_parallel(args.xapi_files, competency_hierarchy, args.workers, args.by_learner, resolver,
+                                                               validator, metrics)
+        if metrics is not None:
+            metrics.count("statements_scored", sum(sum(accumulator.counts) for accumulator in learner_accumulators.values()))
+            metrics.record_facet_misses(ordinals, learner_accumulators.values(), resolver.known)
+        return accumulator_results(args, model, learner_accumulators, ordinals, metrics)
+    elif args.state:
+        from .state_store import ScoreStateStore
+        ordinals = resolver.ordinals
+        with ScoreStateStore(args.state) as store:
+            with timed(metrics, "aggregate"):
+                stats = store.fold(xapi_activities, resolver)
+                learner_accumulators = store.learner_accumulators(ordinals)
+        if metrics is not None:
+            metrics.count("statements_scored", stats["added"])
+            metrics.count("statements_skipped", stats["already_seen"] + stats["duplicates"] + stats["voided"])
+            metrics.record_facet_misses(ordinals, learner_accumulators.values(), resolver.known)
+        return accumulator_results(args, model, learner_accumulators, ordinals, metrics)
+    elif args.engine == "numpy":
+        from .aggregation_engine import engine_results, score_matrix
+        with timed(metrics, "aggregate"):
+            matrix = score_matrix(xapi_activities, model, by_learner=args.by_learner, resolver=resolver)
+        if metrics is not None:
+            metrics.count("statements_scored", matrix.statements())
+            metrics.record_facet_misses(resolver.ordinals, [matrix], resolver.known)
+        with timed(metrics, "roll_up"):
+            if binary:
+                from .results_file import matrix_arrays
+                return matrix_arrays(model, matrix)
+            results = engine_results(matrix, model, mapping_table_resource)
+        if args.by_learner:
+            return {learner: results_document(*scores) for learner, scores in results.items()}
+        return results_document(*results[ALL_LEARNERS])
+    elif binary and weighting is None and rollup is None:
+        with timed(metrics, "aggregate"):
+            learner_accumulators = collect_learner_accumulators(xapi_activities, resolver, args.by_learner)
+        if metrics is not None:
+            metrics.count("statements_scored", sum(sum(accumulator.counts) for accumulator in learner_accumulators.values()))
+            metrics.record_facet_misses(resolver.ordinals, learner_accumulators.values(), resolver.known)
+        return accumulator_results(args, model, learner_accumulators, resolver.ordinals, metrics)
+    elif args.by_learner:
+        output_data = {
+            learner: results_document(*results)
+            for learner, results in map_activities_by_learner(xapi_activities, competency_hierarchy, mapping_table_resource, metrics, resolver,
+                                                              weighting, rollup).items()
+        }
+    else:
+        output_data = results_document(*map_activities_to_competencies(xapi_activities, competency_hierarchy, mapping_table_resource,
+                                                                       metrics, resolver, weighting, rollup))
+    if binary:
+        from .results_file import results_arrays
+        return results_arrays(model, output_data, args.by_learner)
+    return output_data
+
+def collect_learner_accumulators(xapi_activities, resolver, by_learner):
+    # One FacetAccumulator per learner (a single one without by_learner)
+    learner_accumulators = {}
+    for activity in xapi_activities:
+        learner = learner_id(activity["statement"]["actor"]) if by_learner else ALL_LEARNERS
+        accumulator = learner_accumulators.get(learner)
+        if accumulator is None:
+            accumulator = learner_accumulators[learner] = FacetAccumulator(resolver.known)
+        add_activity_score(activity, accumulator, resolver)
+    return learner_accumulators
+
+def accumulator_results(args, model, learner_accumulators, ordinals, metrics=None):
+    # Results of score_files for accumulators collected per learner
+    with timed(metrics, "roll_up"):
+        if args.format == "binary":
+            from .results_file import accumulator_arrays
+            return accumulator_arrays(model, learner_accumulators, args.by_learner)
+        return results_from_accumulators(learner_accumulators, ordinals, model.hierarchy(), mapping_table_resource, args.by_learner)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import json
+import math
+import os
+import shutil
+from collections import Counter
+
+from .generate_mapping import VOIDED_VERB, learner_id, slim_activity, slim_statement
+from .temporal_scoring import statement_time
+
+ADL_VERBS = "http://adlnet.gov/expapi/verbs/"
+
+NUMBER_TYPES = (int, float)
+
+# Fields a scored statement needs, in the order a rejection names the first missing one
+REQUIRED_FIELDS = (
+    ("context", "extensions", "learningObjectMetadata"),
+    ("result", "score", "raw"),
+    ("result", "score", "min"),
+    ("result", "score", "max"),
+)
+
+
+def verb_iri(verb):
+    # Short ADL verb names ("answered") stand for their IRI; anything else is an IRI already
+    return verb if ':' in verb else ADL_VERBS + verb
+
+
+class StatementValidator:
+    # Ingestion stage between the parser and the scoring: slims valid statements
+    # and keeps bad ones out of the batch instead of letting one KeyError or
+    # ZeroDivisionError end a run. Rejected statements are counted by reason and,
+    # with a quarantine path, written there as NDJSON ({"reason", "statement"}).
+    #
+    # Statements outside verbs (IRIs or ADL short names; None keeps all) are
+    # dropped and counted as filtered. Raw scores outside [min, max] are clamped,
+    # or rejected with clamp=False. require_actor rejects statements whose actor
+    # cannot be told apart, which matters when scoring by learner and for the
+    # state store; require_time those without a usable timestamp (or stored),
+    # which the time-aware scores need; require_id those without a string id,
+    # which the state store keys them by. Voiding statements are only passed on
+    # with voiding=True (the state store applies them); everywhere else they are
+    # counted as filtered.
+    #
+    # The fast path is a single run of subscripts under one try; the fields are
+    # only walked one by one to name the reason once a statement has failed.
+
+    def __init__(self, verbs=None, clamp=True, require_actor=False, quarantine=None, voiding=False, require_time=False,
+                 require_id=False):
+        self.verbs = frozenset(verb_iri(verb) for verb in verbs) if verbs else None
+        self.clamp = clamp
+        self.require_actor = require_actor
+        self.require_time = require_time
+        self.require_id = require_id
+        self.voiding = voiding
+        self.quarantine = quarantine
+        self.rejected = Counter()
+        self.filtered = 0
+        self.clamped = 0
+        self._quarantine_file = None
+
+    def __call__(self, activity):
+        # The slimmed activity, or None when the statement is filtered or rejected
+        try:
+            statement = activity["statement"] if "statement" in activity else activity
+            if self.require_id and not isinstance(statement["id"], str):
+                return self.reject(activity, "id is not a string")
+            verb = statement["verb"]["id"] if "verb" in statement else None
+            if verb == VOIDED_VERB:
+                if not self.voiding:
+                    self.filtered += 1
+                    return None
+                return slim_activity(activity)
+            metadata = statement["context"]["extensions"]["learningObjectMetadata"]
+            score = statement["result"]["score"]
+            raw, low, high = score["raw"], score["min"], score["max"]
+            if self.require_actor:
+                learner_id(statement["actor"])
+        except (KeyError, TypeError, AttributeError) as error:
+            return self.reject(activity, self.diagnose(activity, error))
+
+        if self.verbs is not None and verb not in self.verbs:
+            self.filtered += 1
+            return None
+        if not (isinstance(metadata, dict) and (metadata.get("competencePath") or metadata.get("facet"))):
+            return self.reject(activity, "learningObjectMetadata has neither competencePath nor facet")
+        if not (type(raw) in NUMBER_TYPES and type(low) in NUMBER_TYPES and type(high) in NUMBER_TYPES):
+            return self.reject(activity, "result.score raw, min and max must be numbers")
+        if not (math.isfinite(low) and math.isfinite(high) and high > low):
+            return self.reject(activity, "result.score max must be greater than min")
+        if raw != raw:
+            return self.reject(activity, "result.score raw is NaN")
+        if self.require_time:
+            try:
+                statement_time(statement)
+            except KeyError:
+                return self.reject(activity, "missing timestamp and stored")
+            except (ValueError, TypeError, AttributeError):
+                return self.reject(activity, "timestamp is not an ISO 8601 date and time")
+
+        if raw < low or raw > high:
+            if not self.clamp:
+                return self.reject(activity, "result.score raw outside [min, max]")
+            self.clamped += 1
+            score = dict(score, raw=min(max(raw, low), high))
+        return slim_statement(activity, statement, verb, metadata, score)
+
+    def diagnose(self, activity, error):
+        if not isinstance(activity, dict):
+            return "statement is not an object"
+        statement = activity["statement"] if "statement" in activity else activity
+        if not isinstance(statement, dict):
+            return "statement is not an object"
+        if self.require_id and "id" not in statement:
+            return "missing id"
+        if "verb" in statement and not (isinstance(statement["verb"], dict) and "id" in statement["verb"]):
+            return "missing verb.id"
+        if "verb" in statement and statement["verb"]["id"] == VOIDED_VERB:
+            return "voiding statement without object.id"
+        for path in REQUIRED_FIELDS:
+            value = statement
+            for depth, key in enumerate(path):
+                if not isinstance(value, dict) or key not in value:
+                    return f"missing {'.'.join(path[:depth + 1])}"
+                value = value[key]
+        if self.require_actor:
+            if not isinstance(statement.get("actor"), dict):
+                return "missing actor"
+            try:
+                learner_id(statement["actor"])
+            except (KeyError, TypeError):
+                return "actor has no account, mbox, mbox_sha1sum or openid"
+        return f"malformed statement ({error!r})"
+
+    def reject(self, activity, reason):
+        self.rejected[reason] += 1
+        if self.quarantine:
+            if self._quarantine_file is None:
+                self._quarantine_file = open(self.quarantine, 'w', encoding='utf-8')
+            self._quarantine_file.write(json.dumps({"reason": reason, "statement": activity}, ensure_ascii=False) + "\n")
+        return None
+
+    def reject_line(self, line, error=None):
+        # A line of an NDJSON file (text or bytes) that is not JSON at all. The
+        # decoder message is left out: it depends on where the line was cut off.
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        return self.reject(line.rstrip('\r\n'), "invalid JSON")
+
+    def shard(self, index):
+        # A validator with the same settings for one worker of parallel_scoring;
+        # its quarantine goes to a part file that merge() appends to ours
+        return StatementValidator(self.verbs, self.clamp, self.require_actor,
+                                  f"{self.quarantine}.part{index}" if self.quarantine else None, self.voiding,
+                                  self.require_time, self.require_id)
+
+    def counts(self):
+        return {"rejected": dict(self.rejected), "filtered": self.filtered, "clamped": self.clamped}
+
+    def merge(self, counts, quarantine_part=None):
+        # Fold the counts of a shard validator (and its part file) into this one
+        self.rejected.update(counts["rejected"])
+        self.filtered += counts["filtered"]
+        self.clamped += counts["clamped"]
+        if quarantine_part and os.path.exists(quarantine_part):
+            if self._quarantine_file is None:
+                self._quarantine_file = open(self.quarantine, 'w', encoding='utf-8')
+            with open(quarantine_part, 'r', encoding='utf-8') as part:
+                shutil.copyfileobj(part, self._quarantine_file)
+            os.remove(quarantine_part)
+
+    def close(self):
+        if self._quarantine_file is not None:
+            self._quarantine_file.close()
+            self._quarantine_file = None
+
+    def __getstate__(self):
+        # Handed to worker processes before anything is quarantined
+        state = dict(self.__dict__)
+        state["_quarantine_file"] = None
+        return state
@@ -0,0 +1,152 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+class Metrics:
+    # Opt-in run metrics: exclusive seconds per pipeline stage, statement counters
+    # and the facets that are not part of the competency model. Functions take
+    # metrics=None and skip all of this when no Metrics object is passed.
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.counters = Counter()
+        self.facet_misses = Counter()
+        # Open stages as [name, started, seconds spent in nested stages]
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        # Nested stages are subtracted from the enclosing one, so the stage
+        # seconds add up to the wall time of the run
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def _enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        name, started, nested = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.seconds[name] = self.seconds.get(name, 0.0) + elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def timed_iter(self, name, iterable):
+        # Charge the time spent producing each item (e.g. parsing statements of a
+        # stream) to a stage of its own instead of the stage that consumes it
+        iterator = iter(iterable)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield item
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def record_facet_misses(self, ordinals, accumulators, known_facets):
+        # Facets outside the hierarchy get the ordinals after the known ones, so
+        # their statement counts can be read off the accumulators afterwards
+        for facet, ordinal in ordinals.items():
+            if ordinal >= known_facets:
+                self.facet_misses[facet] += sum(accumulator.count(ordinal) for accumulator in accumulators)
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "elapsed_seconds": elapsed,
+            "stage_seconds": dict(self.seconds),
+            "counters": dict(self.counters),
+            "statements_per_second": self.counters["statements_read"] / elapsed if elapsed else None,
+            "facet_misses": dict(self.facet_misses),
+        }
+
+    def to_prometheus(self):
+        # Text exposition format, e.g. for the node_exporter textfile collector
+        data = self.to_dict()
+        lines = [
+            "# HELP greta_run_seconds Wall time of the run.",
+            "# TYPE greta_run_seconds gauge",
+            f"greta_run_seconds {data['elapsed_seconds']}",
+            "# HELP greta_stage_seconds Exclusive time spent per pipeline stage.",
+            "# TYPE greta_stage_seconds gauge",
+        ]
+        lines += [f'greta_stage_seconds{{stage="{prometheus_label(stage)}"}} {seconds}'
+                  for stage, seconds in data["stage_seconds"].items()]
+        lines += [
+            "# HELP greta_statements_total Statements by outcome.",
+            "# TYPE greta_statements_total counter",
+        ]
+        lines += [f'greta_statements_total{{outcome="{prometheus_label(name.removeprefix("statements_"))}"}} {value}'
+                  for name, value in data["counters"].items()]
+        lines += [
+            "# HELP greta_statements_per_second Statements read per second of the run.",
+            "# TYPE greta_statements_per_second gauge",
+            f"greta_statements_per_second {data['statements_per_second'] or 0}",
+            "# HELP greta_facet_misses_total Statements whose facet is not in the competency model.",
+            "# TYPE greta_facet_misses_total counter",
+        ]
+        lines += [f'greta_facet_misses_total{{facet="{prometheus_label(facet)}"}} {count}'
+                  for facet, count in data["facet_misses"].items()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_path):
+        # Prometheus text for *.prom files, JSON otherwise
+        with open(file_path, 'w', encoding='utf-8') as f:
+            if file_path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+
+
+def prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def timed(metrics, name):
+    # metrics.stage(name), or nothing at all without metrics
+    return nullcontext() if metrics is None else metrics.stage(name)
+
+
+@contextmanager
+def profiled(mode, output_prefix):
+    # Capture a cProfile (<prefix>.prof, for pstats/snakeviz) or a tracemalloc
+    # snapshot (<prefix>.tracemalloc.txt, top allocation sites) around a block
+    if mode is None:
+        yield
+    elif mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{output_prefix}.prof")
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(f"{output_prefix}.tracemalloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"peak: {peak / 2**20:.1f} MiB, still allocated: {current / 2**20:.1f} MiB\n\n")
+                for stat in snapshot.statistics('lineno')[:30]:
+                    f.write(f"{stat}\n")
+    else:
+        raise ValueError(f"unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
@@ -0,0 +1,142 @@
+from .accumulators import FacetAccumulator
+from .competency_model import CACHE_DIR, MODEL_FILE, load_competency_model, lookup_key
+from .generate_mapping import ALL_LEARNERS, FacetResolver, add_activity_score, learner_id, results_from_accumulators
+
+
+def version_prefixes(version):
+    # "2.0.1" -> ["2.0.1", "2.0", "2"], so a tree of "... 2.0" finds model version 2.0.1
+    parts = version.split('.')
+    return ['.'.join(parts[:end]) for end in range(len(parts), 0, -1)]
+
+
+class RegistrySnapshot:
+    # The models of a registry at one point in time with their routes and
+    # hierarchies. Not changed after it is built (the route memo only caches
+    # lookups of these models), so a scan that holds one sees consistent models,
+    # routes and hierarchies while the registry is refreshed.
+
+    def __init__(self, models):
+        self.models = tuple(models)
+        self._routes = {}
+        for model in reversed(self.models):
+            names = [model.id, model.name] + [f"{model.name} {prefix}" for prefix in version_prefixes(model.version)]
+            for name in names:
+                self._routes[lookup_key(name)] = model
+        self._memo = {}
+        self._hierarchies = {model.key: model.hierarchy() for model in self.models}
+
+    @property
+    def default(self):
+        return self.models[0]
+
+    def get(self, model_id=None):
+        # A model by ID; the default model without one
+        if model_id is None:
+            return self.default
+        for model in self.models:
+            if model.id == model_id:
+                return model
+        raise KeyError(f"no competency model {model_id!r} is loaded")
+
+    def hierarchy(self, model):
+        return self._hierarchies[model.key]
+
+    def route(self, metadata):
+        # The model of a statement's learningObjectMetadata, memoized per (path root, tree)
+        path = metadata.get("competencePath")
+        key = (path.split('/', 1)[0] if path else None, metadata.get("tree"))
+        model = self._memo.get(key)
+        if model is None:
+            model = self._memo[key] = self._route(*key)
+        return model
+
+    def _route(self, root, tree):
+        for text in (root, tree):
+            if text:
+                model = self._routes.get(lookup_key(text))
+                if model is not None:
+                    return model
+        return self.default
+
+
+class ModelRegistry:
+    # Several competency models side by side, e.g. GRETA 2.0 and its successor.
+    # A statement goes to the model named by the first segment of its
+    # competencePath (the model ID, e.g. greta_v2_0_1), else by its tree (the
+    # model name with its version or a prefix of it, "GRETA Kompetenzmodell 2.0"),
+    # else to the default model, the first one. When two models claim the same
+    # name, the earlier one wins. Results are keyed by model ID, so two files
+    # with the same ID (e.g. two versions of greta_v2_0_1) are refused.
+    #
+    # refresh() reloads the models whose file changed (load_competency_model
+    # checks a stat per file), so a long-running process picks up edits without
+    # a restart. It builds a new RegistrySnapshot and swaps it in with a single
+    # assignment; readers take self.snapshot once per request or scan.
+
+    def __init__(self, model_files=(MODEL_FILE,), cache_dir=CACHE_DIR):
+        self.model_files = list(model_files)
+        self.cache_dir = cache_dir
+        self.snapshot = None
+        self.refresh()
+
+    def refresh(self):
+        # True when a model was (re)loaded. Raises ValueError, and keeps the
+        # current snapshot, when two of the files share a model ID.
+        models = [load_competency_model(file_path, self.cache_dir) for file_path in self.model_files]
+        seen = {}
+        for file_path, model in zip(self.model_files, models):
+            if model.id in seen:
+                other_file, other = seen[model.id]
+                raise ValueError(f"{other_file} (version {other.version}) and {file_path} (version {model.version}) "
+                                 f"both define competency model {model.id}")
+            seen[model.id] = file_path, model
+        snapshot = self.snapshot
+        if snapshot is not None and len(models) == len(snapshot.models) and all(new is old for new, old in zip(models, snapshot.models)):
+            return False
+        self.snapshot = RegistrySnapshot(models)
+        return True
+
+    @property
+    def models(self):
+        return self.snapshot.models
+
+    @property
+    def default(self):
+        return self.snapshot.default
+
+    def get(self, model_id=None):
+        return self.snapshot.get(model_id)
+
+
+def score_by_model(xapi_activities, snapshot, mapping_table_resource, by_learner=False, metrics=None):
+    # {model ID: results document (or {learner: document})} in one scan over the
+    # models of a RegistrySnapshot: every statement is routed to its model and
+    # resolved against that model's facets. Returns the documents and the
+    # resolver of every model that got statements.
+    resolvers = {}
+    model_accumulators = {}
+    for activity in xapi_activities:
+        statement = activity["statement"]
+        model = snapshot.route(statement["context"]["extensions"]["learningObjectMetadata"])
+        resolver = resolvers.get(model.key)
+        if resolver is None:
+            resolver = resolvers[model.key] = FacetResolver(snapshot.hierarchy(model))
+            model_accumulators[model.key] = {}
+        learner_accumulators = model_accumulators[model.key]
+        learner = learner_id(statement["actor"]) if by_learner else ALL_LEARNERS
+        accumulator = learner_accumulators.get(learner)
+        if accumulator is None:
+            accumulator = learner_accumulators[learner] = FacetAccumulator(resolver.known)
+        add_activity_score(activity, accumulator, resolver)
+
+    results = {}
+    for model in snapshot.models:
+        if model.key not in resolvers:
+            continue
+        resolver = resolvers[model.key]
+        if metrics is not None:
+            metrics.count("statements_scored", sum(sum(accumulator.counts) for accumulator in model_accumulators[model.key].values()))
+            metrics.record_facet_misses(resolver.ordinals, model_accumulators[model.key].values(), resolver.known)
+        results[model.id] = results_from_accumulators(model_accumulators[model.key], resolver.ordinals,
+                                                      snapshot.hierarchy(model), mapping_table_resource, by_learner)
+    return results, [resolvers[model.key] for model in snapshot.models if model.key in resolvers]
@@ -0,0 +1,140 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from .accumulators import FacetAccumulator
+from .instrumentation import Metrics
+from .generate_mapping import ALL_LEARNERS, FacetResolver, add_activity_score, iter_xapi_data, learner_id, slim_activity
+
+
+def is_ndjson(file_path):
+    # Plain (not gzipped) files of one JSON document per line can be split at line
+    # boundaries, which shows in the first line being a complete document. JSON
+    # arrays and concatenated pretty-printed documents are read as a whole by one
+    # worker, as iter_json_values reads them serially.
+    with open(file_path, 'rb') as f:
+        if f.read(2) == b'\x1f\x8b':
+            return False
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                break
+        else:
+            return False
+    if line.lstrip().startswith(b'['):
+        return False
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+def plan_shards(file_paths, shard_count):
+    # (path, start, end) byte ranges; end None means the whole file
+    shards = []
+    for file_path in file_paths:
+        size = os.path.getsize(file_path)
+        if shard_count <= 1 or not is_ndjson(file_path) or size == 0:
+            shards.append((file_path, 0, None))
+            continue
+        bounds = [size * i // shard_count for i in range(shard_count + 1)]
+        shards.extend((file_path, start, end) for start, end in zip(bounds, bounds[1:]) if start < end)
+    return shards
+
+
+def iter_shard(shard, validator=None, metrics=None):
+    # Statements of one shard. A line belongs to the range its first byte lies in,
+    # so neighbouring ranges neither share nor lose a line.
+    file_path, start, end = shard
+    if end is None:
+        yield from iter_xapi_data(file_path, metrics, validator)
+        return
+    with open(file_path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            if validator is None:
+                activity = json.loads(line)
+                if metrics is not None:
+                    metrics.count("statements_read")
+                yield slim_activity(activity)
+                continue
+            try:
+                activity = json.loads(line)
+            except json.JSONDecodeError as error:
+                validator.reject_line(line, error)
+                continue
+            if metrics is not None:
+                metrics.count("statements_read")
+            slim = validator(activity)
+            if slim is not None:
+                yield slim
+
+
+def score_shard(shard, competency_hierarchy, by_learner=True, validator=None):
+    # Worker: normalize and accumulate one shard. Facets outside the hierarchy are
+    # numbered locally; the returned ordinals let the parent translate them.
+    # The shard's counters (statements read) go back to the parent's metrics.
+    resolver = FacetResolver(competency_hierarchy)
+    metrics = Metrics()
+    learner_accumulators = {}
+    for activity in iter_shard(shard, validator, metrics):
+        learner = learner_id(activity["statement"]["actor"]) if by_learner else ALL_LEARNERS
+        accumulator = learner_accumulators.get(learner)
+        if accumulator is None:
+            accumulator = learner_accumulators[learner] = FacetAccumulator(resolver.known)
+        add_activity_score(activity, accumulator, resolver)
+    if validator is None:
+        return resolver.ordinals, learner_accumulators, resolver.unresolved, None, metrics.counters
+    validator.close()
+    return resolver.ordinals, learner_accumulators, resolver.unresolved, validator.counts(), metrics.counters
+
+
+def merge_shard_results(shard_results, competency_hierarchy, resolver=None):
+    # Merge in shard order, so learners and unknown facets keep the order in which
+    # a serial run would have met them; unresolved statements add up in resolver
+    resolver = resolver or FacetResolver(competency_hierarchy)
+    ordinals = resolver.ordinals
+    learner_accumulators = {}
+    for shard_ordinals, shard_accumulators, shard_unresolved, _, _ in shard_results:
+        resolver.unresolved.update(shard_unresolved)
+        ordinal_map = [0] * len(shard_ordinals)
+        for facet, shard_ordinal in shard_ordinals.items():
+            ordinal_map[shard_ordinal] = resolver.add_facet(facet)
+        for learner, accumulator in shard_accumulators.items():
+            if learner not in learner_accumulators:
+                learner_accumulators[learner] = FacetAccumulator(len(ordinals))
+            learner_accumulators[learner].merge(accumulator, ordinal_map)
+    return ordinals, learner_accumulators
+
+
+def score_in_parallel(file_paths, competency_hierarchy, workers=None, by_learner=True, resolver=None, validator=None,
+                      metrics=None):
+    # Split NDJSON files into byte ranges (other exports go whole, one per worker)
+    # and accumulate the shards in a process pool. With a validator, every shard
+    # validates with a copy of it; counts and quarantined statements are folded
+    # back in shard order, like the counters of the shards into metrics.
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(file_paths, workers)
+    validators = [validator.shard(index) if validator is not None else None for index in range(len(shards))]
+    if workers == 1 or len(shards) == 1:
+        shard_results = [score_shard(shard, competency_hierarchy, by_learner, shard_validator)
+                         for shard, shard_validator in zip(shards, validators)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_results = list(pool.map(score_shard, shards, repeat(competency_hierarchy), repeat(by_learner), validators))
+    if validator is not None:
+        for shard_validator, (_, _, _, counts, _) in zip(validators, shard_results):
+            validator.merge(counts, shard_validator.quarantine)
+    if metrics is not None:
+        for shard_result in shard_results:
+            metrics.counters.update(shard_result[4])
+    return merge_shard_results(shard_results, competency_hierarchy, resolver)
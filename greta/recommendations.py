@@ -0,0 +1,165 @@
+import argparse
+import heapq
+import json
+import sys
+
+from .competency_model import MODEL_FILE, load_competency_model
+from .weighting import parse_duration
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_K = 3
+
+
+class ResourceCatalog:
+    # Learning resources indexed by facet. Each facet keeps its resources sorted
+    # once at load time (lowest level first, then shortest, then id), so
+    # recommending for a learner never looks at the resources of facets they are
+    # not weak in, and a cohort run never rescans the catalog.
+    #
+    # Resources are dicts with id, title, url, facet (the canonical facet name),
+    # level and hours (None when unknown).
+
+    def __init__(self, resources, model=None):
+        # With a model, the facet of a resource may be given as name, ID, path or
+        # competencePath; resources whose facet is not in the model are kept in
+        # unresolved instead of being indexed
+        self.by_facet = {}
+        self.unresolved = []
+        for resource in resources:
+            facet = resource["facet"]
+            if model is not None:
+                ordinal = model.ordinal("facet", facet)
+                if ordinal is None:
+                    self.unresolved.append(resource)
+                    continue
+                facet = model.facet_names[ordinal]
+            hours = parse_duration(resource["duration"]) if resource.get("duration") else resource.get("hours")
+            self.by_facet.setdefault(facet, []).append({
+                "id": resource.get("id", resource["url"]),
+                "title": resource.get("title", ""),
+                "url": resource["url"],
+                "facet": facet,
+                "level": resource.get("level", 1),
+                "hours": hours,
+            })
+        for facet_resources in self.by_facet.values():
+            facet_resources.sort(key=lambda resource: (resource["level"], resource["hours"] is None,
+                                                       resource["hours"] or 0.0, resource["id"]))
+
+    @classmethod
+    def from_mapping(cls, mapping_table_resource):
+        # The one-link-per-facet table of generate_mapping as a catalog
+        return cls({"facet": facet, "url": url} for facet, url in mapping_table_resource.items())
+
+    def __len__(self):
+        return sum(len(facet_resources) for facet_resources in self.by_facet.values())
+
+    def recommend(self, facet_scores, k=DEFAULT_K, threshold=DEFAULT_THRESHOLD, per_facet=None, max_hours=None):
+        # Top-k resources for the facets scoring below threshold ({facet: score}).
+        # A heap hands them out round by round: the best resource of every weak
+        # facet, weakest facet first, then the second best, and so on. k=None
+        # returns all of them, per_facet caps the resources of one facet.
+        heap = [(0, score, facet) for facet, score in facet_scores.items()
+                if score < threshold and facet in self.by_facet]
+        heapq.heapify(heap)
+        picks = []
+        while heap and (k is None or len(picks) < k):
+            position, score, facet = heapq.heappop(heap)
+            facet_resources = self.by_facet[facet]
+            resource = facet_resources[position]
+            if max_hours is None or resource["hours"] is None or resource["hours"] <= max_hours:
+                picks.append(dict(resource, achievement=score))
+            position += 1
+            if position < len(facet_resources) and (per_facet is None or position < per_facet):
+                heapq.heappush(heap, (position, score, facet))
+        return picks
+
+    def low_score_links(self, facet_scores, threshold=DEFAULT_THRESHOLD):
+        # The former low_score_links: the best resource of every weak facet, weakest first
+        return [{"id": resource["facet"], "link": resource["url"]}
+                for resource in self.recommend(facet_scores, k=None, threshold=threshold, per_facet=1)]
+
+
+def load_catalog(file_path, model):
+    # A JSON list of resources, or {"resources": [...]}; every resource needs a
+    # facet and a url and may have id, title, level and duration ("3h45m")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data["resources"]
+    return ResourceCatalog(data, model)
+
+
+_mapping_catalogs = {}
+
+
+def resource_catalog(resources):
+    # A ResourceCatalog as is; a mapping table is indexed once and then reused
+    if isinstance(resources, ResourceCatalog):
+        return resources
+    entry = _mapping_catalogs.get(id(resources))
+    if entry is None or entry[0] is not resources:
+        entry = _mapping_catalogs[id(resources)] = (resources, ResourceCatalog.from_mapping(resources))
+    return entry[1]
+
+
+def recommend_cohort(catalog, learner_scores, k=DEFAULT_K, threshold=DEFAULT_THRESHOLD, per_facet=None, max_hours=None):
+    # {learner: recommendations} for (learner, {facet: score}) pairs
+    return {
+        learner: catalog.recommend(facet_scores, k, threshold, per_facet, max_hours)
+        for learner, facet_scores in learner_scores
+    }
+
+
+def iter_learner_facet_scores(results_file, model):
+    # (learner, {facet: score}) from a results file of greta score: JSON,
+    # one document or {learner: document}, or the binary format
+    from .results_file import ResultsFile, is_results_file
+
+    if is_results_file(results_file):
+        with ResultsFile(results_file) as results:
+            results.check_model(model)
+            learners = results.learners
+            facet_means = results.columns["facet_achievement"].tolist()
+        for learner, row in zip(learners, facet_means):
+            yield learner, dict(zip(model.facet_names, row))
+        return
+    with open(results_file, 'r', encoding='utf-8') as f:
+        output_data = json.load(f)
+    documents = {"": output_data} if "Facet Scores" in output_data else output_data
+    for learner, document in documents.items():
+        facet_scores = {}
+        records = document["Facet Scores"]
+        for record, ordinal in zip(records, model.ordinals("facet", [record["id"] for record in records])):
+            if ordinal is not None:
+                facet_scores[model.facet_names[ordinal]] = record["achievement"]
+        yield learner, facet_scores
+
+
+def main():
+    from .generate_mapping import mapping_table_resource
+
+    parser = argparse.ArgumentParser(description="Recommend learning resources for the weakest facets of every learner.")
+    parser.add_argument("results_file", help="greta_results.json, a --by-learner document or a binary results file")
+    parser.add_argument("--catalog", help="resource catalog JSON (default: the links of greta score)")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="resources per learner")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="facets scoring below this are weak")
+    parser.add_argument("--per-facet", type=int, help="at most this many resources for one facet")
+    parser.add_argument("--max-hours", type=float, help="leave out resources that take longer")
+    parser.add_argument("-o", "--output", default="greta_recommendations.json")
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    args = parser.parse_args()
+
+    model = load_competency_model(args.model)
+    catalog = load_catalog(args.catalog, model) if args.catalog else ResourceCatalog.from_mapping(mapping_table_resource)
+    for resource in catalog.unresolved:
+        print(f"Resource {resource.get('id', resource['url'])} names unknown facet {resource['facet']!r}", file=sys.stderr)
+
+    recommendations = recommend_cohort(catalog, iter_learner_facet_scores(args.results_file, model),
+                                       args.k, args.threshold, args.per_facet, args.max_hours)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(recommendations, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
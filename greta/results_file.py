@@ -0,0 +1,251 @@
+import argparse
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from .accumulators import FacetAccumulator
+from .aggregation_engine import ScoreMatrix, roll_up
+from .competency_model import MODEL_FILE, load_competency_model
+from .generate_mapping import ALL_LEARNERS
+
+# Fixed-layout results file:
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | header (UTF-8 JSON)
+#   | columns, each little-endian, C order and aligned to ALIGNMENT bytes
+# The header names the competency model (ID, Version) the ordinals refer to, the
+# learners (one row each) and the dtype, shape and offset of every column. Column
+# offsets count from the data section, which starts at the first aligned byte
+# after the header.
+MAGIC = b"GRETARES"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+
+# name -> (dtype, level whose ordinals are the columns)
+COLUMNS = {
+    "facet_achievement": ("<f8", "facet"),
+    "facet_count": ("<i8", "facet"),
+    "facet_variance": ("<f8", "facet"),
+    "area_achievement": ("<f8", "area"),
+    "aspect_achievement": ("<f8", "aspect"),
+}
+
+
+def is_results_file(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def level_sizes(model):
+    return {"facet": len(model.facet_ids), "area": len(model.area_ids), "aspect": len(model.aspect_ids)}
+
+
+def results_arrays(model, output_data, by_learner):
+    # Results documents (one, or {learner: document}) as one row per learner.
+    # Only for documents that exist anyway (JSON input, time-aware and weighted
+    # scores); scores still in accumulators go through accumulator_arrays.
+    documents = output_data if by_learner else {ALL_LEARNERS: output_data}
+    sizes = level_sizes(model)
+    arrays = {name: np.zeros((len(documents), sizes[level]), dtype=dtype) for name, (dtype, level) in COLUMNS.items()}
+    for row, document in enumerate(documents.values()):
+        records = document["Facet Scores"]
+        for record, k in zip(records, model.ordinals("facet", [record["id"] for record in records])):
+            if k is None:
+                continue
+            arrays["facet_achievement"][row, k] = record["achievement"]
+            arrays["facet_count"][row, k] = record["count"]
+            arrays["facet_variance"][row, k] = record["variance"]
+        for level, key in (("area", "Area Scores"), ("aspect", "Aspect Scores")):
+            records = document[key]
+            achievements = arrays[f"{level}_achievement"][row]
+            for record, ordinal in zip(records, model.ordinals(level, [record["id"] for record in records])):
+                if ordinal is not None:
+                    achievements[ordinal] = record["achievement"]
+    return list(documents), arrays
+
+
+def matrix_arrays(model, matrix):
+    # The columns of a ScoreMatrix (numpy engine), without building documents
+    facet_achievement = matrix.means()
+    area_achievement, aspect_achievement, _ = roll_up(facet_achievement, model)
+    return list(matrix.learners), {
+        "facet_achievement": facet_achievement,
+        "facet_count": matrix.counts.astype(np.int64),
+        "facet_variance": matrix.variances(),
+        "area_achievement": area_achievement,
+        "aspect_achievement": aspect_achievement,
+    }
+
+
+def accumulator_arrays(model, learner_accumulators, by_learner):
+    # The columns of the FacetAccumulators of the python engine, --workers and
+    # --state, read straight from their arrays by facet ordinal; without
+    # by_learner all learners are merged into one row like results_from_accumulators
+    if not by_learner:
+        merged = FacetAccumulator(len(model.facet_ids))
+        for accumulator in learner_accumulators.values():
+            merged.merge(accumulator)
+        learner_accumulators = {ALL_LEARNERS: merged}
+    size = len(model.facet_ids)
+    shape = (len(learner_accumulators), size)
+    sums, sums_sq = np.zeros(shape), np.zeros(shape)
+    counts = np.zeros(shape, dtype=np.int64)
+    for row, accumulator in enumerate(learner_accumulators.values()):
+        accumulator.grow(size)
+        sums[row] = np.frombuffer(accumulator.sums, count=size)
+        sums[row] += np.frombuffer(accumulator.sums_err, count=size)
+        sums_sq[row] = np.frombuffer(accumulator.sums_sq, count=size)
+        sums_sq[row] += np.frombuffer(accumulator.sums_sq_err, count=size)
+        counts[row] = np.frombuffer(accumulator.counts, dtype=np.int64, count=size)
+    return matrix_arrays(model, ScoreMatrix(list(learner_accumulators), sums, sums_sq, counts))
+
+
+def write_results(file_path, model, output_data, by_learner=False):
+    write_arrays(file_path, model, *results_arrays(model, output_data, by_learner), by_learner)
+
+
+def write_arrays(file_path, model, learners, arrays, by_learner=False):
+    header = {
+        "model": {"id": model.id, "name": model.name, "version": model.version},
+        "by_learner": by_learner,
+        "learners": learners,
+        "columns": {},
+    }
+    offset = 0
+    for name, array in arrays.items():
+        header["columns"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    with open(file_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        data_start = aligned(f.tell())
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + header["columns"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class ResultsFile:
+    # Read-only, zero-copy view of a results file: the columns are NumPy arrays
+    # backed by a memory map, so opening a cohort file costs a header parse no
+    # matter how many learners it holds. close() unmaps the file right away when
+    # no arrays from columns or scores() are held any more; otherwise the map
+    # stays open, and those arrays valid, until the last of them is collected.
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, header_length = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{file_path} is not a GRETA results file")
+        if format_version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{file_path} has results format {format_version}, expected {FORMAT_VERSION}")
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + header_length].decode('utf-8'))
+        data_start = aligned(PREAMBLE.size + header_length)
+        self.model_id = header["model"]["id"]
+        self.model_version = header["model"]["version"]
+        self.by_learner = header["by_learner"]
+        self.learners = header["learners"]
+        self._rows = {learner: row for row, learner in enumerate(self.learners)}
+        self.columns = {
+            name: np.frombuffer(self._mmap, dtype=column["dtype"], count=int(np.prod(column["shape"])),
+                                offset=data_start + column["offset"]).reshape(column["shape"])
+            for name, column in header["columns"].items()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.columns = {}
+        if self._mmap is None:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a view; the mmap is unmapped when the last one
+            # and this reference are gone
+            pass
+        self._mmap = None
+
+    @property
+    def model_key(self):
+        return (self.model_id, self.model_version)
+
+    def check_model(self, model):
+        if model.key != self.model_key:
+            raise ValueError(f"results were written for competency model {self.model_id} {self.model_version}, "
+                             f"not {model.id} {model.version}")
+
+    def scores(self, learner=ALL_LEARNERS):
+        # Facet, area and aspect achievements of one learner by model ordinal
+        row = self._rows[learner]
+        return (self.columns["facet_achievement"][row], self.columns["area_achievement"][row],
+                self.columns["aspect_achievement"][row])
+
+    def document(self, model, learner=ALL_LEARNERS):
+        # The JSON results document of one learner, as greta score writes it
+        self.check_model(model)
+        row = self._rows[learner]
+        facet_means = self.columns["facet_achievement"][row]
+        counts = self.columns["facet_count"][row]
+        variances = self.columns["facet_variance"][row]
+        stddevs = np.sqrt(variances)
+        area_means = self.columns["area_achievement"][row]
+        aspect_means = self.columns["aspect_achievement"][row]
+        return {
+            "Facet Scores": [
+                {
+                    "id": model.facet_path(k),
+                    "achievement": float(facet_means[k]),
+                    "count": int(counts[k]),
+                    "variance": float(variances[k]),
+                    "stddev": float(stddevs[k]),
+                }
+                for k in range(len(model.facet_ids))
+            ],
+            # Areas with placeholder facets only are written as int 0, like summarize_competencies does
+            "Area Scores": [
+                {"id": model.area_path(j), "achievement": float(area_means[j]) if len(model.area_facets(j)) else 0}
+                for j in range(len(model.area_ids))
+            ],
+            "Aspect Scores": [
+                {"id": model.aspect_names[i], "achievement": float(aspect_means[i])}
+                for i in range(len(model.aspect_ids))
+            ],
+        }
+
+    def export(self, model):
+        # JSON export view of the whole file
+        if self.by_learner:
+            return {learner: self.document(model, learner) for learner in self.learners}
+        return self.document(model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a binary GRETA results file as JSON.")
+    parser.add_argument("results_file")
+    parser.add_argument("-o", "--output", default="greta_results.json")
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    args = parser.parse_args()
+
+    model = load_competency_model(args.model)
+    with ResultsFile(args.results_file) as results:
+        output_data = results.export(model)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output_data, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .competency_model import MODEL_FILE
+from .generate_mapping import map_activities_by_learner, map_activities_to_competencies, mapping_table_resource, results_document
+from .ingestion import StatementValidator
+from .model_registry import ModelRegistry, score_by_model
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'jpg': 'image/jpeg'}
+
+# Resolutions /chart accepts; a 600 dpi raster is about 4800 x 4800 pixels
+MIN_DPI, MAX_DPI = 10, 600
+
+
+class ScoringPipeline:
+    # generate_mapping and visual_chart in one process: the competency model, its
+    # hierarchy and the plotting stack are loaded once and reused for every call,
+    # and results are handed over in memory instead of through greta_results.json.
+    # The plotting stack is only imported by the first chart, so scoring alone
+    # never pays for matplotlib.
+    #
+    # model_files is one competency model JSON or a list of them. Every call
+    # checks the files and picks up an edited model without a restart; with
+    # several models the statements are routed by model_registry and the scores
+    # are keyed by model ID. Statements pass a StatementValidator first, so a
+    # malformed or voiding statement is skipped instead of failing the batch.
+
+    def __init__(self, model_files=MODEL_FILE):
+        if isinstance(model_files, str):
+            model_files = [model_files]
+        self.registry = ModelRegistry(model_files)
+        self._refresh_lock = threading.Lock()
+        # pyplot keeps global state and is not thread safe
+        self._render_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.registry.default
+
+    @property
+    def competency_hierarchy(self):
+        snapshot = self.registry.snapshot
+        return snapshot.hierarchy(snapshot.default)
+
+    def refresh(self):
+        # A model edit that would make two files share an ID is reported and the
+        # previous models keep serving
+        with self._refresh_lock:
+            try:
+                return self.registry.refresh()
+            except ValueError as error:
+                print(f"Keeping the loaded competency models: {error}", file=sys.stderr)
+                return False
+
+    def score(self, xapi_activities, by_learner=False, validator=None):
+        # validator: a StatementValidator to read the rejected counts from afterwards
+        if validator is None:
+            validator = StatementValidator(require_actor=by_learner)
+        xapi_activities = (slim for slim in map(validator, xapi_activities) if slim is not None)
+        self.refresh()
+        # One snapshot for the whole request, whatever a concurrent refresh swaps in
+        snapshot = self.registry.snapshot
+        if len(snapshot.models) > 1:
+            return score_by_model(xapi_activities, snapshot, mapping_table_resource, by_learner)[0]
+        competency_hierarchy = snapshot.hierarchy(snapshot.default)
+        if by_learner:
+            return {
+                learner: results_document(*results)
+                for learner, results in map_activities_by_learner(xapi_activities, competency_hierarchy, mapping_table_resource).items()
+            }
+        return results_document(*map_activities_to_competencies(xapi_activities, competency_hierarchy, mapping_table_resource))
+
+    def chart(self, result_data, format='png', dpi=100, model_id=None):
+        # The wheel of one model; visual_chart rebuilds the geometry when the model changed
+        model = self.registry.get(model_id)
+        with self._render_lock:
+            import matplotlib
+            matplotlib.use('Agg')
+            from .visual_chart import get_chart_renderer
+            return get_chart_renderer(model).render(result_data, format=format, dpi=dpi)
+
+
+def statements_from_body(body):
+    # A single statement, a list of statements or a statements API result
+    # ({"statements": [...]}); Learning Locker envelopes are accepted as well.
+    # They are validated and slimmed by ScoringPipeline.score.
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get("statements", [payload])
+    if not isinstance(payload, list):
+        raise ValueError("expected a statement, a list of statements or a statements result")
+    return payload
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    # POST /scores[?by_learner=1]                 -> results document(s) as JSON
+    # POST /chart[?learner=..&model=..&format=png&dpi=100] -> competency wheel of the statements
+    # With several models /scores is keyed by model ID and /chart draws the
+    # model of ?model= (the first model by default). Statements that fail
+    # validation are skipped and counted in the X-Rejected-Statements header.
+    # GET  /health
+    pipeline = None
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            self._send(200, 'application/json', b'{"status": "ok"}')
+        else:
+            self._send_error(404, "not found")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            xapi_activities = statements_from_body(self.rfile.read(length))
+            by_learner = query.get('by_learner') in ('1', 'true') or 'learner' in query
+            validator = StatementValidator(require_actor=by_learner)
+            if url.path == '/scores':
+                result_data = self.pipeline.score(xapi_activities, by_learner, validator)
+                body = json.dumps(result_data, ensure_ascii=False).encode('utf-8')
+                self._send(200, 'application/json; charset=utf-8', body, rejected_header(validator))
+            elif url.path == '/chart':
+                image_format = query.get('format', 'png')
+                if image_format not in CONTENT_TYPES:
+                    self._send_error(400, f"unsupported format {image_format}")
+                    return
+                dpi = query.get('dpi', '100')
+                if not (dpi.isdigit() and MIN_DPI <= int(dpi) <= MAX_DPI):
+                    self._send_error(400, f"dpi must be a whole number from {MIN_DPI} to {MAX_DPI}")
+                    return
+                try:
+                    model = self.pipeline.registry.get(query.get('model'))
+                except KeyError:
+                    self._send_error(404, f"no competency model {query['model']}")
+                    return
+                result_data = self.pipeline.score(xapi_activities, by_learner, validator)
+                if len(self.pipeline.registry.models) > 1:
+                    result_data = result_data.get(model.id)
+                    if result_data is None:
+                        self._send_error(404, f"no statements for model {model.id}")
+                        return
+                if 'learner' in query:
+                    result_data = result_data.get(query['learner'])
+                    if result_data is None:
+                        self._send_error(404, f"no statements for learner {query['learner']}")
+                        return
+                image = self.pipeline.chart(result_data, image_format, int(dpi), model.id)
+                self._send(200, CONTENT_TYPES[image_format], image, rejected_header(validator))
+            else:
+                self._send_error(404, "not found")
+        except (ValueError, KeyError, TypeError, ZeroDivisionError) as error:
+            self._send_error(400, f"invalid statements: {error!r}")
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send(status, 'application/json', json.dumps({"error": message}).encode('utf-8'))
+
+
+def rejected_header(validator):
+    return {'X-Rejected-Statements': str(sum(validator.rejected.values()))}
+
+
+def serve(host='127.0.0.1', port=8000, model_files=MODEL_FILE):
+    ScoringRequestHandler.pipeline = ScoringPipeline(model_files)
+    server = ThreadingHTTPServer((host, port), ScoringRequestHandler)
+    print(f"Serving GRETA scores on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve GRETA competency scores and charts over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", nargs="+", default=[MODEL_FILE],
+                        help="competency model JSON; several models are routed by competencePath or tree")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.model)
+
+
+if __name__ == '__main__':
+    main()
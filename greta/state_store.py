@@ -0,0 +1,194 @@
+import sqlite3
+
+from .accumulators import FacetAccumulator
+from .generate_mapping import VOIDED_VERB, learner_id, normalize_score
+from .temporal_scoring import parse_time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    id TEXT PRIMARY KEY,
+    learner TEXT NOT NULL,
+    facet TEXT NOT NULL,
+    score REAL NOT NULL,
+    voided INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS statements_learner_facet ON statements (learner, facet);
+CREATE TABLE IF NOT EXISTS voided (
+    id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS accumulators (
+    learner TEXT NOT NULL,
+    facet TEXT NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    sum_sq REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (learner, facet)
+);
+CREATE TABLE IF NOT EXISTS high_water_mark (
+    rowid INTEGER PRIMARY KEY CHECK (rowid = 1),
+    stored TEXT NOT NULL,
+    id TEXT NOT NULL
+);
+"""
+
+UPSERT_ACCUMULATOR = """
+INSERT INTO accumulators (learner, facet, sum, count, sum_sq, min, max) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (learner, facet) DO UPDATE SET
+    sum = sum + excluded.sum,
+    count = count + excluded.count,
+    sum_sq = sum_sq + excluded.sum_sq,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max)
+"""
+
+
+def stored_time(stored):
+    # Seconds of a stored time, None when there is none or it is not ISO 8601
+    if not isinstance(stored, str):
+        return None
+    try:
+        return parse_time(stored)
+    except (ValueError, OverflowError):
+        return None
+
+
+class ScoreStateStore:
+    # Per learner and facet accumulators persisted in SQLite, so a daily run only
+    # folds in the statements the LRS stored since the previous run.
+    #
+    # Statements are remembered by ID (to drop duplicates and to undo them when a
+    # voiding statement arrives later) and the newest stored time seen is kept as
+    # a high-water mark; statements stored before it are skipped without touching
+    # the database. Times are compared as instants, so fractions of a second and
+    # UTC offsets order correctly. Statements stored at the mark itself, or
+    # without a (parseable) stored time, always go through the ID table.
+    # Rerunning the same export is therefore a no-op.
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def high_water_mark(self):
+        # The (stored, id) of the newest statement folded in so far
+        row = self.connection.execute("SELECT stored, id FROM high_water_mark WHERE rowid = 1").fetchone()
+        return tuple(row) if row else None
+
+    def fold(self, xapi_activities, resolver=None):
+        # Fold new statements into the store in a single transaction and return
+        # how many were added, already seen, duplicated or voided. With a
+        # FacetResolver, facets are stored under their canonical name.
+        stats = {"added": 0, "already_seen": 0, "duplicates": 0, "voided": 0}
+        high_water_mark = self.high_water_mark()
+        mark_time = stored_time(high_water_mark[0]) if high_water_mark else None
+        new_mark, new_time = high_water_mark, mark_time
+        voided_ids = {row[0] for row in self.connection.execute("SELECT id FROM voided")}
+        void_targets = []
+        deltas = {}
+
+        with self.connection:
+            for activity in xapi_activities:
+                statement = activity["statement"]
+                time = stored_time(statement.get("stored"))
+                if time is not None:
+                    if mark_time is not None and time < mark_time:
+                        stats["already_seen"] += 1
+                        continue
+                    if new_time is None or time > new_time:
+                        new_mark, new_time = (statement["stored"], statement["id"]), time
+
+                if statement["verb"] and statement["verb"]["id"] == VOIDED_VERB:
+                    target = statement["object"]["id"]
+                    if target not in voided_ids:
+                        voided_ids.add(target)
+                        void_targets.append(target)
+                        self.connection.execute("INSERT OR IGNORE INTO voided (id) VALUES (?)", (target,))
+                    continue
+                if activity.get("voided") or statement["id"] in voided_ids:
+                    stats["voided"] += 1
+                    continue
+
+                learner = learner_id(statement["actor"])
+                metadata = statement["context"]["extensions"]["learningObjectMetadata"]
+                facet = metadata["facet"] if resolver is None else resolver.facet(metadata)
+                score = normalize_score(statement["result"]["score"])
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO statements (id, learner, facet, score) VALUES (?, ?, ?, ?)",
+                    (statement["id"], learner, facet, score))
+                if not cursor.rowcount:
+                    stats["duplicates"] += 1
+                    continue
+                stats["added"] += 1
+
+                delta = deltas.get((learner, facet))
+                if delta is None:
+                    deltas[(learner, facet)] = [score, 1, score * score, score, score]
+                else:
+                    delta[0] += score
+                    delta[1] += 1
+                    delta[2] += score * score
+                    delta[3] = min(delta[3], score)
+                    delta[4] = max(delta[4], score)
+
+            self.connection.executemany(
+                UPSERT_ACCUMULATOR,
+                ((learner, facet, *delta) for (learner, facet), delta in deltas.items()))
+
+            # Statements voided after they were folded in are taken out again; their
+            # accumulator is rebuilt from the remaining statements (min/max cannot
+            # be subtracted)
+            for target in void_targets:
+                row = self.connection.execute(
+                    "SELECT learner, facet FROM statements WHERE id = ? AND voided = 0", (target,)).fetchone()
+                if row is None:
+                    continue
+                self.connection.execute("UPDATE statements SET voided = 1 WHERE id = ?", (target,))
+                self._rebuild_accumulator(*row)
+                stats["voided"] += 1
+
+            if new_mark is not None and new_mark != high_water_mark:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO high_water_mark (rowid, stored, id) VALUES (1, ?, ?)", new_mark)
+        return stats
+
+    def _rebuild_accumulator(self, learner, facet):
+        total, count, total_sq, minimum, maximum = self.connection.execute(
+            "SELECT SUM(score), COUNT(*), SUM(score * score), MIN(score), MAX(score) "
+            "FROM statements WHERE learner = ? AND facet = ? AND voided = 0", (learner, facet)).fetchone()
+        if count:
+            self.connection.execute(
+                "UPDATE accumulators SET sum = ?, count = ?, sum_sq = ?, min = ?, max = ? WHERE learner = ? AND facet = ?",
+                (total, count, total_sq, minimum, maximum, learner, facet))
+        else:
+            self.connection.execute("DELETE FROM accumulators WHERE learner = ? AND facet = ?", (learner, facet))
+
+    def learner_accumulators(self, ordinals):
+        # Load the stored state as one FacetAccumulator per learner; facets that are
+        # not in ordinals yet are appended to it, as in map_activities_to_competencies
+        learner_accumulators = {}
+        rows = self.connection.execute(
+            "SELECT learner, facet, sum, count, sum_sq, min, max FROM accumulators ORDER BY learner")
+        for learner, facet, total, count, total_sq, minimum, maximum in rows:
+            accumulator = learner_accumulators.get(learner)
+            if accumulator is None:
+                accumulator = learner_accumulators[learner] = FacetAccumulator(len(ordinals))
+            ordinal = ordinals.get(facet)
+            if ordinal is None:
+                ordinal = ordinals[facet] = len(ordinals)
+            accumulator.grow(ordinal + 1)
+            accumulator.sums[ordinal] = total
+            accumulator.counts[ordinal] = count
+            accumulator.sums_sq[ordinal] = total_sq
+            accumulator.mins[ordinal] = minimum
+            accumulator.maxs[ordinal] = maximum
+        return learner_accumulators
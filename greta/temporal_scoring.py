@@ -0,0 +1,129 @@
+import math
+import re
+from datetime import datetime, timezone
+
+from .accumulators import DecayAccumulator, TimeBucketAccumulator
+from .generate_mapping import ALL_LEARNERS, FacetResolver, learner_id, normalize_score, results_document, summarize_competencies
+
+DAY = 86400.0
+
+# Fractional seconds of any length and zone offsets without a colon; before
+# Python 3.11 fromisoformat only takes 3 or 6 digits and +HH:MM
+FRACTION = re.compile(r'(?<=:\d\d)[.,](\d+)')
+OFFSET = re.compile(r'([+-]\d\d)(\d\d)$')
+
+
+def parse_time(text):
+    # ISO 8601 timestamp of the xAPI statement as seconds since the epoch;
+    # timestamps without a zone are taken as UTC
+    text = text.replace('Z', '+00:00')
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        text = FRACTION.sub(lambda match: '.' + match.group(1)[:6].ljust(6, '0'), text)
+        moment = datetime.fromisoformat(OFFSET.sub(r'\1:\2', text))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+
+def statement_time(statement):
+    # When the learner did it (timestamp), falling back to when the LRS stored it
+    text = statement.get("timestamp") or statement.get("stored")
+    if not text:
+        raise KeyError("statement has neither timestamp nor stored")
+    return parse_time(text)
+
+
+def map_activities_over_time(xapi_activities, competency_hierarchy, new_accumulator, by_learner=True, resolver=None,
+                             metrics=None):
+    # One scan into time-aware accumulators (DecayAccumulator or
+    # TimeBucketAccumulator) per learner; returns the facet ordinals, the
+    # accumulators and the time of the newest statement. With metrics, counts
+    # the statements scored and those of facets outside the hierarchy.
+    resolver = resolver or FacetResolver(competency_hierarchy)
+    learner_accumulators = {}
+    latest = -math.inf
+    for activity in xapi_activities:
+        statement = activity["statement"]
+        time = statement_time(statement)
+        learner = learner_id(statement["actor"]) if by_learner else ALL_LEARNERS
+        accumulator = learner_accumulators.get(learner)
+        if accumulator is None:
+            accumulator = learner_accumulators[learner] = new_accumulator(resolver.known)
+        ordinal = resolver.ordinal(statement["context"]["extensions"]["learningObjectMetadata"])
+        accumulator.add(ordinal, normalize_score(statement["result"]["score"]), time)
+        latest = max(latest, time)
+        if metrics is not None:
+            metrics.count("statements_scored")
+            if ordinal >= resolver.known:
+                metrics.facet_misses[resolver.facets[ordinal]] += 1
+    if not by_learner and not learner_accumulators:
+        learner_accumulators[ALL_LEARNERS] = new_accumulator(resolver.known)
+    return resolver.ordinals, learner_accumulators, latest
+
+
+def per_learner(learner_accumulators, by_learner, document):
+    # document(accumulator) for every learner, or for the single profile
+    if by_learner:
+        return {learner: document(accumulator) for learner, accumulator in learner_accumulators.items()}
+    return document(learner_accumulators[ALL_LEARNERS])
+
+
+def decayed_results(xapi_activities, competency_hierarchy, mapping_table_resource, half_life_days, by_learner=False, resolver=None,
+                    metrics=None):
+    # Results documents in which every score counts by its age relative to the
+    # newest score of its facet
+    ordinals, learner_accumulators, _ = map_activities_over_time(
+        xapi_activities, competency_hierarchy, lambda size: DecayAccumulator(half_life_days * DAY, size), by_learner, resolver, metrics)
+    return per_learner(learner_accumulators, by_learner, lambda accumulator: results_document(
+        *summarize_competencies(accumulator, ordinals, competency_hierarchy, mapping_table_resource)))
+
+
+def sliding_window_results(xapi_activities, competency_hierarchy, mapping_table_resource, window_days, bucket_days=1.0,
+                           as_of=None, by_learner=False, resolver=None, metrics=None):
+    # Results documents over the last window_days up to as_of (default: the newest
+    # statement), with the window edges rounded out to whole buckets
+    ordinals, learner_accumulators, latest = map_activities_over_time(
+        xapi_activities, competency_hierarchy, lambda size: TimeBucketAccumulator(bucket_days * DAY, size), by_learner, resolver, metrics)
+    end = parse_time(as_of) if as_of else latest
+    return per_learner(learner_accumulators, by_learner, lambda accumulator: results_document(
+        *summarize_competencies(accumulator.window(end, window_days * DAY), ordinals, competency_hierarchy, mapping_table_resource)))
+
+
+def tumbling_window_results(xapi_activities, competency_hierarchy, mapping_table_resource, window_days, by_learner=False, resolver=None,
+                            metrics=None):
+    # {window start: results document} for consecutive windows of window_days
+    ordinals, learner_accumulators, _ = map_activities_over_time(
+        xapi_activities, competency_hierarchy, lambda size: TimeBucketAccumulator(window_days * DAY, size), by_learner, resolver, metrics)
+    return per_learner(learner_accumulators, by_learner, lambda accumulator: {
+        format_time(start): results_document(*summarize_competencies(bucket, ordinals, competency_hierarchy, mapping_table_resource))
+        for start, bucket in accumulator.tumbling()
+    })
+
+
+def trend_results(xapi_activities, competency_hierarchy, bucket_days=7.0, by_learner=False, resolver=None, metrics=None):
+    # Progress per facet: the bucket means and the slope of the fitted line in
+    # achievement per day
+    ordinals, learner_accumulators, _ = map_activities_over_time(
+        xapi_activities, competency_hierarchy, lambda size: TimeBucketAccumulator(bucket_days * DAY, size), by_learner, resolver, metrics)
+
+    def facet_trends(accumulator):
+        trends = []
+        for aspect, areas in competency_hierarchy.items():
+            for area, facets in areas.items():
+                for facet in facets:
+                    points, slope = accumulator.trend(ordinals[facet])
+                    trends.append({
+                        "id": f"{aspect}/{area}/{facet}",
+                        "slope_per_day": slope * DAY if slope is not None else None,
+                        "points": [{"start": format_time(start), "achievement": score, "count": count}
+                                   for start, score, count in points],
+                    })
+        return {"Facet Trends": trends}
+
+    return per_learner(learner_accumulators, by_learner, facet_trends)
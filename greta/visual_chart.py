@@ -0,0 +1,340 @@
+import argparse
+import io
+import json
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.layout_engine import TightLayoutEngine
+from PIL import Image
+
+from .competency_model import MODEL_FILE, load_competency_model
+from .instrumentation import PROFILE_MODES, Metrics, profiled, timed
+
+
+def get_color(achievement):
+    if 0 <= achievement <= 0.25:
+        return '#C0C0C0'
+    elif 0.25 < achievement <= 0.5:
+        return '#C4D4A0'
+    elif 0.5 < achievement <= 0.75:
+        return '#A4B97F'
+    elif 0.75 < achievement <= 1:
+        return '#8A9A5B'
+
+
+def scores_by_ordinal(model, items, level, size, key='achievement'):
+    # Place the result records on the model ordinals; anything without a record scores 0
+    achievements = [0] * size
+    for item, ordinal in zip(items, model.ordinals(level, [item['id'] for item in items])):
+        if ordinal is not None and item[key] is not None:
+            achievements[ordinal] = item[key]
+    return achievements
+
+
+def cohort_medians(model, cohort_document):
+    # Facet medians by ordinal from the output of cohort_analytics.py
+    return scores_by_ordinal(model, cohort_document["Facet Distributions"], "facet", len(model.facet_ids), key='median')
+
+
+def area_sizes(model):
+    # Wedge sizes count the placeholder facets too, so the wheel keeps the layout of the model
+    return [len(model.area_facets(j)) + model.area_placeholders[j] for j in range(len(model.area_ids))]
+
+
+def chart_colors(model, result_data):
+    # Wedge colors of the aspect, facet and area rings for one results document
+    facet_scores = scores_by_ordinal(model, result_data["Facet Scores"], "facet", len(model.facet_ids))
+    area_scores = scores_by_ordinal(model, result_data["Area Scores"], "area", len(model.area_ids))
+    aspect_scores = scores_by_ordinal(model, result_data["Aspect Scores"], "aspect", len(model.aspect_ids))
+    return achievement_colors(model, facet_scores, area_scores, aspect_scores)
+
+
+def achievement_colors(model, facet_scores, area_scores, aspect_scores):
+    # Wedge colors for achievements that are already indexed by model ordinal
+    colors1 = [get_color(score) for score in aspect_scores]
+    colors2 = facet_ring_colors(model, facet_scores)
+    colors3 = [get_color(score) for score in area_scores]
+    return colors1, colors2, colors3
+
+
+def facet_ring_colors(model, facet_scores):
+    colors = []
+    for j in range(len(model.area_ids)):
+        colors.extend(get_color(facet_scores[k]) for k in model.area_facets(j))
+        colors.extend([get_color(0)] * model.area_placeholders[j])
+    return colors
+
+
+def split_text(text, max_length):
+    words = text.split()
+    lines = []
+    current_line = ""
+
+    for word in words:
+        if len(current_line) + len(word) + 1 <= max_length:
+            if current_line:
+                current_line += " "
+            current_line += word
+        else:
+            lines.append(current_line)
+            current_line = word
+
+    if current_line:
+        lines.append(current_line)
+
+    return "\n".join(lines)
+
+
+def build_chart(model, cohort_ring=False):
+    # Everything of the wheel that only depends on the model: ring geometry,
+    # wedge sizes and the label layout. Wedges start out grey (achievement 0).
+    # cohort_ring adds a thin outer ring with one wedge per facet for the
+    # cohort medians.
+    sizes = area_sizes(model)
+
+    labels1 = list(model.aspect_labels)
+    sizes1 = [sum(sizes[j] for j in model.aspect_areas(i)) for i in range(len(model.aspect_ids))]
+
+    labels3 = list(model.area_labels)
+    sizes3 = sizes
+
+    labels2 = []
+    for j in range(len(model.area_ids)):
+        labels2.extend(model.facet_labels[k] for k in model.area_facets(j))
+        labels2.extend(['TBD'] * model.area_placeholders[j])
+    sizes2 = [1] * len(labels2)
+
+    colors1 = [get_color(0)] * len(sizes1)
+    colors2 = [get_color(0)] * len(sizes2)
+    colors3 = [get_color(0)] * len(sizes3)
+
+    labels1 = [split_text(label, 25) for label in labels1]
+    labels2 = [split_text(label, 17) for label in labels2]
+    labels3 = [split_text(label, 15) for label in labels3]
+
+    fig, ax = plt.subplots(figsize=(12, 12))
+
+
+    wedges1, texts1 = ax.pie(sizes1, colors=colors1, radius=1.3, startangle=90, wedgeprops=dict(width=0.25, edgecolor='w'))
+
+
+    wedges2, texts2 = ax.pie(sizes2, colors=colors2, radius=1.05, startangle=90, wedgeprops=dict(width=0.5, edgecolor='w'))
+
+
+    wedges3, texts3 = ax.pie(sizes3, colors=colors3, radius=0.55, startangle=90, wedgeprops=dict(width=0.37, edgecolor='w'))
+
+    rings = (wedges1, wedges2, wedges3)
+    if cohort_ring:
+        wedges4, texts4 = ax.pie(sizes2, colors=colors2, radius=1.4, startangle=90, wedgeprops=dict(width=0.07, edgecolor='w'))
+        rings += (wedges4,)
+        ax.text(0, -1.5, "Äußerer Ring: Median der Kohorte", horizontalalignment='center', verticalalignment='center', fontsize=8)
+
+
+    for i, p in enumerate(wedges1):
+        ang = (p.theta2 - p.theta1)/2. + p.theta1
+        y = np.sin(np.deg2rad(ang)) * 1.15
+        x = np.cos(np.deg2rad(ang)) * 1.15
+        rotation = ang + 270 if ang <= 180 else ang - 90
+        ax.annotate(labels1[i], xy=(x, y), xytext=(x, y), textcoords='data',
+                    ha='center', va='center', rotation=rotation, fontsize=10, rotation_mode='anchor')
+
+
+    for i, p in enumerate(wedges2):
+        ang = (p.theta2 - p.theta1)/2. + p.theta1
+        y = np.sin(np.deg2rad(ang)) * 0.58
+        x = np.cos(np.deg2rad(ang)) * 0.58
+        ax.text(x, y, labels2[i], horizontalalignment='left', verticalalignment='center', fontsize=8, rotation=ang, rotation_mode='anchor')
+
+    for i, p in enumerate(wedges3):
+        ang = (p.theta2 - p.theta1)/2. + p.theta1
+        y = np.sin(np.deg2rad(ang)) * 0.21
+        x = np.cos(np.deg2rad(ang)) * 0.21
+        ax.text(x, y, labels3[i], horizontalalignment='left', verticalalignment='center', fontsize=8, rotation=ang, rotation_mode='anchor')
+
+
+    center_text = "Professionelle\nHandlungs-\nkompetenz\nLehrender"
+    ax.text(0, 0, center_text, horizontalalignment='center', verticalalignment='center', fontsize=8, fontweight='bold', color='black')
+
+
+    ax.axis('equal')
+
+    # Same as fig.tight_layout(), but without leaving a layout engine on the figure,
+    # which would make every savefig draw the figure twice
+    TightLayoutEngine().execute(fig)
+    return fig, rings
+
+
+def recolor_chart(rings, colors):
+    for wedges, ring_colors in zip(rings, colors):
+        for wedge, color in zip(wedges, ring_colors):
+            wedge.set_facecolor(color)
+
+
+def draw_chart(result_data, model=None, medians=None):
+    # medians: facet medians of the cohort by ordinal, drawn as an outer ring
+    model = model or load_competency_model()
+    fig, rings = build_chart(model, cohort_ring=medians is not None)
+    colors = chart_colors(model, result_data)
+    if medians is not None:
+        colors += (facet_ring_colors(model, medians),)
+    recolor_chart(rings, colors)
+    return fig
+
+
+class ChartRenderer:
+    # Reusable wheel for rendering many results documents: the figure is built once
+    # per model and only the wedge colors change per learner. The tight bounding
+    # box is measured once as well, since the layout never changes.
+    #
+    # Raster output goes one step further: the labels are rasterized once per dpi
+    # into a transparent layer, and each chart only draws the wedges and puts that
+    # layer on top. Text rendering is most of the cost of a chart. A layer only
+    # keeps the pixels the labels cover (under 2 % of the chart, 2.5 MiB at 300
+    # dpi), as uint8, and only for the last LABEL_LAYERS resolutions.
+
+    RASTER_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG'}
+    LABEL_LAYERS = 2
+
+    def __init__(self, model=None, medians=None):
+        # With the facet medians of a cohort, every chart shows them as an outer
+        # ring; it is colored once here, as it is the same for every learner
+        self.model = model or load_competency_model()
+        self.fig, self.rings = build_chart(self.model, cohort_ring=medians is not None)
+        if medians is not None:
+            recolor_chart(self.rings[3:], [facet_ring_colors(self.model, medians)])
+        self.labels = list(self.fig.axes[0].texts)
+        renderer = self.fig.canvas.get_renderer()
+        self.bbox_inches = self.fig.get_tightbbox(renderer).padded(plt.rcParams['savefig.pad_inches'])
+        self._label_layers = {}
+
+    def render(self, result_data, output=None, format='png', dpi=300):
+        # Write to output (a path or a binary file object); without output the
+        # image is returned as bytes. result_data is a results document or the
+        # (facet, area, aspect) achievements of a binary results file.
+        if isinstance(result_data, dict):
+            colors = chart_colors(self.model, result_data)
+        else:
+            colors = achievement_colors(self.model, *result_data)
+        recolor_chart(self.rings, colors)
+        buffer = io.BytesIO() if output is None else output
+        if format in self.RASTER_FORMATS:
+            self._raster(dpi).save(buffer, self.RASTER_FORMATS[format])
+        else:
+            self.fig.savefig(buffer, format=format, bbox_inches=self.bbox_inches, dpi=dpi)
+        if output is None:
+            return buffer.getvalue()
+
+    def _label_layer(self, dpi):
+        # The flat indices of the label pixels of the cropped chart, their
+        # premultiplied colors and their transparency (255 - alpha), rasterized
+        # once per dpi; the least recently used dpi is dropped
+        layer = self._label_layers.pop(dpi, None)
+        if layer is None:
+            wedges = [wedge for ring in self.rings for wedge in ring]
+            self._set_visible(wedges + [self.fig.patch], False)
+            try:
+                self.fig.set_dpi(dpi)
+                self.fig.canvas.draw()
+                rgba = self._crop(np.asarray(self.fig.canvas.buffer_rgba()), dpi)
+            finally:
+                self._set_visible(wedges + [self.fig.patch], True)
+            rgba = rgba.reshape(-1, 4)
+            covered = np.flatnonzero(rgba[:, 3])
+            alpha = rgba[covered, 3:].astype(np.uint16)
+            layer = (covered, ((rgba[covered, :3] * alpha + 127) // 255).astype(np.uint8),
+                     (255 - alpha).astype(np.uint8))
+            while len(self._label_layers) >= self.LABEL_LAYERS:
+                del self._label_layers[next(iter(self._label_layers))]
+        self._label_layers[dpi] = layer
+        return layer
+
+    def _raster(self, dpi):
+        covered, label_colors, label_transparency = self._label_layer(dpi)
+        self._set_visible(self.labels, False)
+        try:
+            self.fig.set_dpi(dpi)
+            self.fig.canvas.draw()
+            image = np.ascontiguousarray(self._crop(np.asarray(self.fig.canvas.buffer_rgba())[..., :3], dpi))
+        finally:
+            self._set_visible(self.labels, True)
+        # The premultiplied colors never exceed alpha, so the sum stays within uint8
+        pixels = image.reshape(-1, 3)
+        pixels[covered] = label_colors + ((pixels[covered] * label_transparency.astype(np.uint16) + 127) // 255).astype(np.uint8)
+        return Image.fromarray(image)
+
+    def _crop(self, pixels, dpi):
+        # Crop to the tight bounding box (pixel rows count from the top)
+        height = pixels.shape[0]
+        bbox = self.bbox_inches
+        return pixels[int(round(height - bbox.y1 * dpi)):int(round(height - bbox.y0 * dpi)),
+                      int(round(bbox.x0 * dpi)):int(round(bbox.x1 * dpi))]
+
+    @staticmethod
+    def _set_visible(artists, visible):
+        for artist in artists:
+            artist.set_visible(visible)
+
+    def close(self):
+        plt.close(self.fig)
+
+
+_chart_renderers = {}
+
+
+def get_chart_renderer(model):
+    # One renderer per model ID and Version; a model recompiled from a changed
+    # file gets a new one, since its geometry and labels may have changed
+    renderer = _chart_renderers.get(model.key)
+    if renderer is None or renderer.model.digest != model.digest:
+        if renderer is not None:
+            renderer.close()
+        renderer = _chart_renderers[model.key] = ChartRenderer(model)
+    return renderer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw the competency wheel of a results document.")
+    parser.add_argument("results_file", nargs="?", default="greta_results.json")
+    parser.add_argument("-o", "--output", default="greta_kompetenzmodell.jpg")
+    parser.add_argument("--format", choices=("png", "jpg", "svg"),
+                        help="image format (default: from the --output extension, else jpg)")
+    parser.add_argument("--dpi", type=int, default=300, help="resolution of png and jpg output (default: 300)")
+    parser.add_argument("--cohort", metavar="FILE", help="overlay the facet medians of greta cohort output as an outer ring")
+    parser.add_argument("--model", default=MODEL_FILE, help="competency model JSON")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write stage timings to FILE (Prometheus text for *.prom, JSON otherwise)")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="capture a profile of drawing and saving into <output>.prof or <output>.tracemalloc.txt")
+    args = parser.parse_args()
+    if args.dpi <= 0:
+        parser.error("--dpi must be positive")
+    image_format = args.format or {'.png': 'png', '.svg': 'svg'}.get(os.path.splitext(args.output)[1].lower(), 'jpg')
+    metrics = Metrics() if args.metrics else None
+
+    with open(args.results_file, 'r', encoding='utf-8') as f:
+        result_data = json.load(f)
+    model = load_competency_model(args.model)
+    medians = None
+    if args.cohort:
+        with open(args.cohort, 'r', encoding='utf-8') as f:
+            medians = cohort_medians(model, json.load(f))
+
+    with profiled(args.profile, args.output):
+        with timed(metrics, "draw"):
+            renderer = get_chart_renderer(model) if medians is None else ChartRenderer(model, medians)
+
+        # Save before showing: closing the window destroys the figure, and on a
+        # headless (Agg) backend there is nothing to show
+        with timed(metrics, "save"):
+            renderer.render(result_data, args.output, format=image_format, dpi=args.dpi)
+
+    print(f"{image_format.upper()} file generated successfully.")
+    if metrics is not None:
+        metrics.write(args.metrics)
+
+    if plt.get_backend().lower() != 'agg':
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
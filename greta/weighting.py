@@ -0,0 +1,89 @@
+import re
+from functools import lru_cache
+
+# Weight of a statement whose metadata lacks the field a weighting reads
+DEFAULT_WEIGHT = 1.0
+
+DURATION_PATTERN = re.compile(
+    r'(?:(?P<days>\d+(?:\.\d+)?)d)?(?:t)?(?:(?P<hours>\d+(?:\.\d+)?)h)?'
+    r'(?:(?P<minutes>\d+(?:\.\d+)?)m(?:in)?)?(?:(?P<seconds>\d+(?:\.\d+)?)s)?')
+
+
+@lru_cache(maxsize=None)
+def parse_duration(text):
+    # Hours of a typicalLearningTime such as "3h45m", "45m", "1h 30min" or ISO 8601
+    # "PT3H45M"; None when the text is not a duration. A course has few distinct
+    # durations, so each one is parsed once per process.
+    compact = re.sub(r'\s+', '', str(text)).lower()
+    if compact.startswith('p'):
+        compact = compact[1:]
+    match = DURATION_PATTERN.fullmatch(compact)
+    if not compact or match is None or not any(match.groupdict().values()):
+        return None
+    parts = {name: float(value) if value else 0.0 for name, value in match.groupdict().items()}
+    return parts["days"] * 24 + parts["hours"] + parts["minutes"] / 60 + parts["seconds"] / 3600
+
+
+def metadata_number(metadata, key):
+    try:
+        value = float(metadata[key])
+    except (KeyError, TypeError, ValueError):
+        return DEFAULT_WEIGHT
+    return value if value > 0 else DEFAULT_WEIGHT
+
+
+def credits_weight(metadata):
+    return metadata_number(metadata, "credits")
+
+
+def level_weight(metadata):
+    return metadata_number(metadata, "level")
+
+
+def time_weight(metadata):
+    # Hours of typical learning time: an 8 hour module outweighs a 5 minute quiz.
+    # Only strings reach the lru_cache of parse_duration; lists or objects are
+    # unhashable and numbers carry no unit, so they weigh DEFAULT_WEIGHT.
+    text = metadata.get("educational_typicalLearningTime_duration")
+    if not isinstance(text, str):
+        return DEFAULT_WEIGHT
+    hours = parse_duration(text)
+    return hours if hours else DEFAULT_WEIGHT
+
+
+def credits_time_weight(metadata):
+    return credits_weight(metadata) * time_weight(metadata)
+
+
+# Statement weightings: learningObjectMetadata -> weight > 0. Add an entry with
+# register_weighting to make a strategy available to greta score --weighting.
+WEIGHTINGS = {
+    "credits": credits_weight,
+    "level": level_weight,
+    "time": time_weight,
+    "credits_time": credits_time_weight,
+}
+
+
+def register_weighting(name, weighting):
+    WEIGHTINGS[name] = weighting
+    return weighting
+
+
+def mean_rollup(scores, weights):
+    # Every child counts the same, as summarize_competencies does without a roll-up
+    return (sum(scores) / len(scores) if scores else 0), sum(weights)
+
+
+def weighted_rollup(scores, weights):
+    # Children count by the statement weight behind them, so an area is the
+    # weighted mean of all its statements and facets without any do not pull it down
+    total = sum(weights)
+    return (sum(score * weight for score, weight in zip(scores, weights)) / total if total else 0), total
+
+
+# Area and aspect roll-ups: (child scores, child weights) -> (score, weight)
+ROLLUPS = {
+    "mean": mean_rollup,
+    "weighted": weighted_rollup,
+}
@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from greta.competency_model import load_competency_model
+
+HOME_PAGE = "https://lms.example.org"
+
+
+@pytest.fixture(scope="session")
+def model():
+    return load_competency_model()
+
+
+def synthetic_export(model, statement_count=600, learner_count=12, seed=7):
+    # Learning Locker export records over the facets of the model, with scores on
+    # a few scales, one unknown facet and learners that repeat facets
+    rnd = random.Random(seed)
+    stored = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    records = []
+    for index in range(statement_count):
+        k = rnd.randrange(len(model.facet_ids) + 1)
+        if k < len(model.facet_ids):
+            metadata = {"competencePath": model.paths["facet"][k], "facet": model.facet_names[k]}
+        else:
+            metadata = {"competencePath": f"{model.id}/Unbekannt/Unbekannt/Facette", "facet": "Facette"}
+        score_max = rnd.choice((1, 3, 7, 10))
+        stored += timedelta(seconds=rnd.expovariate(1 / 30))
+        timestamp = stored.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        records.append({
+            "stored": timestamp,
+            "voided": False,
+            "statement": {
+                "id": f"statement-{seed}-{index}",
+                "stored": timestamp,
+                "timestamp": timestamp,
+                "actor": {"account": {"homePage": HOME_PAGE, "name": f"learner-{rnd.randrange(learner_count)}"}},
+                "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+                "object": {"id": f"{HOME_PAGE}/content/{index}"},
+                "context": {"extensions": {"learningObjectMetadata": metadata}},
+                "result": {"score": {"raw": rnd.randint(0, score_max), "min": 0, "max": score_max}},
+            },
+        })
+    return records
+
+
+@pytest.fixture
+def make_export(model):
+    return lambda **options: synthetic_export(model, **options)
+
+
+@pytest.fixture
+def export(model):
+    return synthetic_export(model)
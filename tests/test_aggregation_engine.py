@@ -0,0 +1,25 @@
+import pytest
+
+from greta.aggregation_engine import engine_results, score_matrix
+from greta.generate_mapping import (ALL_LEARNERS, map_activities_by_learner, map_activities_to_competencies, mapping_table_resource,
+                                    results_document, slim_activity)
+
+
+@pytest.mark.parametrize("statement_count", [0, 1, 600])
+def test_numpy_engine_matches_python_path(model, make_export, statement_count):
+    activities = [slim_activity(record) for record in make_export(statement_count=statement_count)]
+    hierarchy = model.hierarchy()
+    expected = results_document(*map_activities_to_competencies(iter(activities), hierarchy, mapping_table_resource))
+    results = engine_results(score_matrix(iter(activities), model, by_learner=False), model, mapping_table_resource)
+    # Bit for bit: the documents compare float by float
+    assert results_document(*results[ALL_LEARNERS]) == expected
+
+
+def test_numpy_engine_matches_python_path_by_learner(model, export):
+    activities = [slim_activity(record) for record in export]
+    hierarchy = model.hierarchy()
+    expected = {learner: results_document(*results)
+                for learner, results in map_activities_by_learner(iter(activities), hierarchy, mapping_table_resource).items()}
+    results = engine_results(score_matrix(iter(activities), model), model, mapping_table_resource)
+    assert {learner: results_document(*scores) for learner, scores in results.items()} == expected
+    assert list(results) == list(expected)
@@ -0,0 +1,113 @@
+import copy
+import json
+
+import pytest
+
+from greta.generate_mapping import iter_xapi_data
+from greta.ingestion import StatementValidator
+from greta.parallel_scoring import score_in_parallel
+
+
+@pytest.fixture
+def record(export):
+    return copy.deepcopy(export[0])
+
+
+def rejected(validator, record):
+    assert validator(record) is None
+    (reason,) = validator.rejected
+    return reason
+
+
+def test_valid_statement_is_slimmed(record):
+    validator = StatementValidator()
+    slim = validator(record)
+    assert slim["statement"]["result"]["score"] == record["statement"]["result"]["score"]
+    assert not validator.rejected
+
+
+def test_max_equal_to_min(record):
+    record["statement"]["result"]["score"].update(raw=1, min=1, max=1)
+    assert rejected(StatementValidator(), record) == "result.score max must be greater than min"
+
+
+def test_missing_metadata(record):
+    del record["statement"]["context"]["extensions"]["learningObjectMetadata"]
+    assert rejected(StatementValidator(), record) == "missing context.extensions.learningObjectMetadata"
+
+
+def test_metadata_without_facet(record):
+    record["statement"]["context"]["extensions"]["learningObjectMetadata"] = {"tree": "GRETA"}
+    assert rejected(StatementValidator(), record) == "learningObjectMetadata has neither competencePath nor facet"
+
+
+def test_nan_raw_score(record):
+    record["statement"]["result"]["score"]["raw"] = float("nan")
+    assert rejected(StatementValidator(), record) == "result.score raw is NaN"
+
+
+@pytest.mark.parametrize("value", [None, 7, "statement", ["statement"]])
+def test_statement_that_is_not_an_object(value):
+    assert rejected(StatementValidator(), {"statement": value}) == "statement is not an object"
+    assert rejected(StatementValidator(), value) == "statement is not an object"
+
+
+def test_actor_required_by_learner(record):
+    record["statement"]["actor"] = {"name": "Anonymous"}
+    assert StatementValidator()(record) is not None
+    assert rejected(StatementValidator(require_actor=True), record) == "actor has no account, mbox, mbox_sha1sum or openid"
+
+
+def test_raw_score_outside_range_is_clamped(record):
+    record["statement"]["result"]["score"].update(raw=12, min=0, max=10)
+    validator = StatementValidator()
+    assert validator(record)["statement"]["result"]["score"]["raw"] == 10
+    assert validator.clamped == 1
+    assert rejected(StatementValidator(clamp=False), record) == "result.score raw outside [min, max]"
+
+
+def test_verb_filter(record):
+    validator = StatementValidator(verbs=["answered"])
+    assert validator(record) is None
+    assert validator.filtered == 1 and not validator.rejected
+    record["statement"]["verb"]["id"] = "http://adlnet.gov/expapi/verbs/answered"
+    assert validator(record) is not None
+
+
+def test_invalid_lines_are_quarantined(tmp_path, export):
+    export_file = tmp_path / "export.ndjson"
+    quarantine = tmp_path / "quarantine.ndjson"
+    with open(export_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(export[0]) + '\n')
+        f.write('{"statement": {"id": "cut off"\n')
+        f.write(json.dumps(export[1]) + '\n')
+    validator = StatementValidator(quarantine=str(quarantine))
+    activities = list(iter_xapi_data(str(export_file), validator=validator))
+    validator.close()
+    assert len(activities) == 2
+    assert validator.rejected == {"invalid JSON": 1}
+    entries = [json.loads(line) for line in open(quarantine, encoding='utf-8')]
+    assert entries == [{"reason": "invalid JSON", "statement": '{"statement": {"id": "cut off"'}]
+
+
+def test_shard_quarantines_are_merged(tmp_path, model, make_export):
+    records = make_export(statement_count=60)
+    for index in (5, 30, 55):
+        records[index]["statement"]["result"]["score"]["max"] = records[index]["statement"]["result"]["score"]["min"]
+    export_file = tmp_path / "export.ndjson"
+    with open(export_file, 'w', encoding='utf-8') as f:
+        for index, record in enumerate(records):
+            f.write(json.dumps(record) + '\n')
+            if index == 20:
+                f.write('not json\n')
+    quarantine = tmp_path / "quarantine.ndjson"
+    validator = StatementValidator(quarantine=str(quarantine))
+    score_in_parallel([str(export_file)], model.hierarchy(), 3, True, validator=validator)
+    validator.close()
+    assert validator.rejected == {"result.score max must be greater than min": 3, "invalid JSON": 1}
+    entries = [json.loads(line) for line in open(quarantine, encoding='utf-8')]
+    assert [entry["reason"] for entry in entries] == ["result.score max must be greater than min", "invalid JSON",
+                                                       "result.score max must be greater than min",
+                                                       "result.score max must be greater than min"]
+    assert entries[0]["statement"]["statement"]["id"] == records[5]["statement"]["id"]
+    assert list(tmp_path.glob("quarantine.ndjson.part*")) == []
@@ -0,0 +1,85 @@
+import io
+import json
+
+import pytest
+
+from greta.generate_mapping import iter_json_values
+
+VALUES = [12345, 678, -0.5e-10, 3.25, True, None, "a string", {"score": {"scaled": 0.875}}, [1, 22, 333], 9876543210]
+
+# Every chunk size from one character up to past the whole document, so that
+# each value is cut at each of its positions
+CHUNK_SIZES = range(1, 120)
+
+
+def decode(text, chunk_size, on_error=None):
+    return list(iter_json_values(io.StringIO(text), chunk_size, on_error))
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_array(chunk_size):
+    assert decode(json.dumps(VALUES), chunk_size) == VALUES
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_ndjson(chunk_size):
+    text = ''.join(json.dumps(value) + '\n' for value in VALUES)
+    assert decode(text, chunk_size) == VALUES
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_numbers_at_end_of_input(chunk_size):
+    assert decode("[12345, 678]", chunk_size) == [12345, 678]
+    assert decode("12345\n678", chunk_size) == [12345, 678]
+    assert decode("12345 678", chunk_size) == [12345, 678]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 64])
+def test_invalid_lines(chunk_size):
+    errors = []
+    text = '12345\n{"broken": \n678\n'
+    assert decode(text, chunk_size, lambda line, error: errors.append(line)) == [12345, 678]
+    assert errors == ['{"broken": ']
+
+
+def test_empty():
+    assert decode("", 4) == []
+    assert decode("[]", 4) == []
+    assert decode(" \n", 4) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 13, 64, 4096])
+def test_invalid_array_elements(chunk_size):
+    errors = []
+    text = '[{"score": 1}, {"score" 2}, [1, {"a": }], tru e, {"score": 3}]'
+    values = decode(text, chunk_size, lambda element, error: errors.append(element))
+    assert values == [{"score": 1}, {"score": 3}]
+    assert errors == ['{"score" 2}', '[1, {"a": }]', 'tru e']
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_pretty_printed_documents(chunk_size):
+    text = ''.join(json.dumps(value, indent=4) + '\n' for value in VALUES)
+    assert decode(text, chunk_size) == VALUES
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.characters_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.characters_read += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1 << 16])
+def test_array_syntax_error_raises_without_reading_on(chunk_size):
+    # The error comes from the bad element, not from the end of the export
+    elements = [json.dumps({"index": index, "padding": "x" * 100}) for index in range(20000)]
+    elements[10] = '{"index": 10, "padding" "x"}'
+    file = CountingReader('[' + ',\n'.join(elements) + ']')
+    with pytest.raises(json.JSONDecodeError, match="Expecting ':' delimiter"):
+        list(iter_json_values(file, chunk_size))
+    assert file.characters_read <= 2 * chunk_size + 2000
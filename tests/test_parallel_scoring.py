@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from greta.generate_mapping import (FacetResolver, collect_learner_accumulators, iter_xapi_data, mapping_table_resource,
+                                    results_from_accumulators)
+from greta.parallel_scoring import plan_shards, score_in_parallel
+
+
+def write_ndjson(file_path, records):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    return str(file_path)
+
+
+def serial_results(file_paths, hierarchy, by_learner):
+    resolver = FacetResolver(hierarchy)
+    activities = (activity for file_path in file_paths for activity in iter_xapi_data(file_path))
+    learner_accumulators = collect_learner_accumulators(activities, resolver, by_learner)
+    return results_from_accumulators(learner_accumulators, resolver.ordinals, hierarchy, mapping_table_resource, by_learner)
+
+
+@pytest.mark.parametrize("by_learner", [False, True])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_matches_serial(tmp_path, model, make_export, by_learner, workers):
+    file_paths = [write_ndjson(tmp_path / "first.ndjson", make_export(seed=1)),
+                  write_ndjson(tmp_path / "second.ndjson", make_export(seed=2, statement_count=250))]
+    assert len(plan_shards(file_paths, workers)) == 2 * workers
+    hierarchy = model.hierarchy()
+    ordinals, learner_accumulators = score_in_parallel(file_paths, hierarchy, workers, by_learner)
+    parallel = results_from_accumulators(learner_accumulators, ordinals, hierarchy, mapping_table_resource, by_learner)
+    serial = serial_results(file_paths, hierarchy, by_learner)
+    assert parallel == serial
+    if by_learner:
+        assert list(parallel) == list(serial)
+
+
+def test_pretty_printed_documents_are_not_split(tmp_path, model, make_export):
+    records = make_export(statement_count=80)
+    file_path = tmp_path / "pretty.json"
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, indent=2) + '\n')
+    assert plan_shards([str(file_path)], 3) == [(str(file_path), 0, None)]
+    hierarchy = model.hierarchy()
+    ordinals, learner_accumulators = score_in_parallel([str(file_path)], hierarchy, 3, True)
+    parallel = results_from_accumulators(learner_accumulators, ordinals, hierarchy, mapping_table_resource, True)
+    assert parallel == serial_results([str(file_path)], hierarchy, True)
+
+
+def test_json_array_is_not_split(tmp_path, make_export):
+    file_path = tmp_path / "export.json"
+    file_path.write_text(json.dumps(make_export(statement_count=20)), encoding='utf-8')
+    assert plan_shards([str(file_path)], 3) == [(str(file_path), 0, None)]
@@ -0,0 +1,35 @@
+import gc
+
+import numpy as np
+
+from greta.generate_mapping import FacetResolver, collect_learner_accumulators, slim_activity
+from greta.results_file import ResultsFile, accumulator_arrays, write_arrays
+
+
+def write_cohort(tmp_path, model, export):
+    resolver = FacetResolver(model.hierarchy())
+    learner_accumulators = collect_learner_accumulators(map(slim_activity, export), resolver, True)
+    file_path = tmp_path / "cohort.grr"
+    write_arrays(file_path, model, *accumulator_arrays(model, learner_accumulators, True), True)
+    return file_path
+
+
+def test_scores_outlive_the_with_block(tmp_path, model, export):
+    file_path = write_cohort(tmp_path, model, export)
+    with ResultsFile(file_path) as results:
+        learner = results.learners[0]
+        expected = [scores.copy() for scores in results.scores(learner)]
+        facet_scores, area_scores, aspect_scores = results.scores(learner)
+    for held, copy in zip((facet_scores, area_scores, aspect_scores), expected):
+        np.testing.assert_array_equal(held, copy)
+    results.close()
+    del facet_scores, area_scores, aspect_scores
+    gc.collect()
+
+
+def test_close_without_views(tmp_path, model, export):
+    results = ResultsFile(write_cohort(tmp_path, model, export))
+    document = results.document(model, results.learners[0])
+    results.close()
+    assert results.columns == {}
+    assert document["Facet Scores"]
@@ -0,0 +1,74 @@
+import pytest
+
+from greta.generate_mapping import VOIDED_VERB, FacetResolver, slim_activity
+from greta.state_store import ScoreStateStore
+
+
+def fold(store_path, records, model):
+    resolver = FacetResolver(model.hierarchy())
+    with ScoreStateStore(store_path) as store:
+        stats = store.fold(map(slim_activity, records), resolver)
+        learner_accumulators = store.learner_accumulators(resolver.ordinals)
+    return stats, learner_accumulators
+
+
+def summary(learner_accumulators):
+    return {learner: (list(accumulator.counts), [pytest.approx(total) for total in accumulator.sums])
+            for learner, accumulator in learner_accumulators.items()}
+
+
+def voiding(record, index):
+    statement = record["statement"]
+    return {"statement": {
+        "id": f"voiding-{index}",
+        "stored": "2030-01-01T00:00:00Z",
+        "actor": statement["actor"],
+        "verb": {"id": VOIDED_VERB},
+        "object": {"objectType": "StatementRef", "id": statement["id"]},
+    }}
+
+
+def test_folding_the_same_batch_twice_is_a_no_op(tmp_path, model, export):
+    store_path = tmp_path / "state.db"
+    stats, first = fold(store_path, export, model)
+    assert stats["added"] == len(export)
+    stats, second = fold(store_path, export, model)
+    assert stats["added"] == 0
+    assert stats["already_seen"] + stats["duplicates"] == len(export)
+    assert summary(second) == summary(first)
+
+
+def test_incremental_batches_match_one_batch(tmp_path, model, export):
+    _, once = fold(tmp_path / "once.db", export, model)
+    fold(tmp_path / "batches.db", export[:250], model)
+    _, batches = fold(tmp_path / "batches.db", export[200:], model)
+    assert summary(batches) == summary(once)
+
+
+def test_voiding_removes_the_target(tmp_path, model, export):
+    targets = [export[3], export[40], export[41]]
+    _, expected = fold(tmp_path / "expected.db", [record for record in export if record not in targets], model)
+
+    store_path = tmp_path / "state.db"
+    fold(store_path, export, model)
+    stats, voided = fold(store_path, [voiding(record, index) for index, record in enumerate(targets)], model)
+    assert stats["voided"] == len(targets)
+    assert summary(voided) == summary(expected)
+
+    # A voided statement that arrives again stays out
+    stats, again = fold(store_path, targets, model)
+    assert stats["added"] == 0
+    assert summary(again) == summary(expected)
+
+
+def test_high_water_mark_compares_instants(tmp_path, model, export):
+    store_path = tmp_path / "state.db"
+    first, later, earlier, unstored = (dict(record, statement=dict(record["statement"])) for record in export[:4])
+    first["statement"]["stored"] = "2024-01-01T00:00:00Z"
+    later["statement"]["stored"] = "2024-01-01T00:00:00.500Z"
+    earlier["statement"]["stored"] = "2024-01-01T01:30:00+02:00"
+    del unstored["statement"]["stored"]
+    assert fold(store_path, [first], model)[0]["added"] == 1
+    assert fold(store_path, [later], model)[0]["added"] == 1
+    assert fold(store_path, [earlier], model)[0]["already_seen"] == 1
+    assert fold(store_path, [unstored], model)[0]["added"] == 1